@@ -0,0 +1,23 @@
+"""
+Benchmarks of the hot paths, run them from the project root with
+``python -m benchmarks.<name> --help``. They are not part of the test suite.
+"""
+from typing import Dict, List
+import statistics
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and max of a list of latencies in seconds, reported in milliseconds"""
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
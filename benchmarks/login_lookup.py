@@ -0,0 +1,93 @@
+"""
+Database side of a login and a signup on a large users table, with and without
+the ux_users_email_lower index.
+
+Seeds the users table of DATABASE_URL up to --users rows, then times
+UserService.get_user_by_email (the login lookup) and UserService.user_exists
+(the signup check) for existing and unknown emails. The "without index" run
+drops the index inside a transaction which is rolled back, so the table is left
+as it was. Password verification is left out, it costs the same either way
+(see benchmarks.password_hashing).
+
+    python -m benchmarks.login_lookup --users 1000000 --repeat 50
+"""
+from benchmarks import percentiles
+from src.auth.service import UserService
+from src.db.main import async_session
+from sqlalchemy import text
+import argparse
+import asyncio
+import random
+import time
+
+SEED_USERS = text("""
+    INSERT INTO users (uid, username, email, first_name, last_name, role, is_verified, password_hash,
+                       created_at, updated_at)
+    SELECT gen_random_uuid(), 'user' || i, 'user' || i || '@bookly.com', 'First', 'Last', 'user', true,
+           'not-a-real-hash', now(), now()
+    FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i
+""")
+
+
+async def seed(target: int, batch: int = 100000):
+    async with async_session() as session:
+        existing = (await session.exec(text("SELECT count(*) FROM users WHERE email LIKE 'user%@bookly.com'"))).one()[0]
+
+        for start in range(existing + 1, target + 1, batch):
+            stop = min(start + batch - 1, target)
+            await session.exec(SEED_USERS, params={'start': start, 'stop': stop})
+            await session.commit()
+            print(f'seeded {stop} users')
+
+        if existing < target:
+            await session.exec(text('ANALYZE users'))
+            await session.commit()
+
+
+async def measure(session, users: int, repeat: int) -> dict:
+    user_service = UserService()
+    emails = [f'USER{random.randint(1, users)}@Bookly.com' for _ in range(repeat)]  # as typed, any case
+    timings = {'login': [], 'signup, taken': [], 'signup, free': []}
+
+    for email in emails:
+        start = time.perf_counter()
+        assert await user_service.get_user_by_email(email, session) is not None
+        timings['login'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        assert await user_service.user_exists(email, session)
+        timings['signup, taken'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        assert not await user_service.user_exists(f'new-{email}', session)
+        timings['signup, free'].append(time.perf_counter() - start)
+
+    return timings
+
+
+async def run(users: int, repeat: int):
+    async with async_session() as session:
+        for label, timings in (await measure(session, users, repeat)).items():
+            print(f'with index    {label:14} {percentiles(timings)}')
+
+    async with async_session() as session:
+        await session.exec(text('DROP INDEX ux_users_email_lower'))  # rolled back below
+
+        for label, timings in (await measure(session, users, repeat)).items():
+            print(f'without index {label:14} {percentiles(timings)}')
+
+        await session.rollback()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50, help='lookups of each kind')
+    args = parser.parse_args()
+
+    await seed(args.users)
+    await run(args.users, args.repeat)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
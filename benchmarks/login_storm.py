@@ -0,0 +1,110 @@
+"""
+Latency of an unrelated endpoint while the worker is flooded with logins.
+
+Drives the app in-process through httpx against DATABASE_URL. A probe requests
+GET /api/v1/tags/ back to back while --concurrency clients keep posting to
+/api/v1/auth/login, once with the hashing on the event loop (the old behaviour)
+and once per pool type. Every login costs a full bcrypt verify, so with inline
+hashing each probe waits behind every hash in flight.
+
+    python -m benchmarks.login_storm --concurrency 20 --seconds 10
+"""
+from benchmarks import percentiles
+from src import app
+from src.auth.schemas import UserCreateModel
+from src.auth.service import UserService
+from src.auth.utils import password_hasher
+from src.db.main import async_session
+import contextlib
+import argparse
+import asyncio
+import httpx
+import io
+import time
+
+EMAIL = 'storm@bookly.com'
+PASSWORD = 'storm-password'
+
+
+async def seed_user():
+    user_service = UserService()
+
+    async with async_session() as session:
+        user = await user_service.get_user_by_email(EMAIL, session)
+        if user is None:
+            user = await user_service.create_user(
+                UserCreateModel(first_name='Login', last_name='Storm', username='storm', email=EMAIL,
+                                password=PASSWORD),
+                session
+            )
+        await user_service.update_user(user, {'is_verified': True}, session)  # the role checker wants a verified user
+
+
+async def probe(client: httpx.AsyncClient, token: str, seconds: float) -> list:
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get('/api/v1/tags/', headers={'Authorization': f'Bearer {token}'})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+
+    return latencies
+
+
+async def storm(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    latencies = []
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post('/api/v1/auth/login', json={'email': EMAIL, 'password': PASSWORD})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code in (200, 503), response.text  # 503 once the hashing queue is full
+
+    return latencies
+
+
+async def run(mode: str, concurrency: int, seconds: float):
+    password_hasher.executor_type = mode
+    password_hasher.reset()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bookly') as client:
+        response = await client.post('/api/v1/auth/login', json={'email': EMAIL, 'password': PASSWORD})
+        token = response.json()['access_token']
+
+        idle = await probe(client, token, 1)
+
+        stop = asyncio.Event()
+        logins = [asyncio.create_task(storm(client, stop)) for _ in range(concurrency)]
+        busy = await probe(client, token, seconds)
+        stop.set()
+        login_latencies = [latency for latencies in await asyncio.gather(*logins) for latency in latencies]
+
+    password_hasher.shutdown()
+
+    return idle, busy, login_latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=20, help='clients logging in at once')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--modes', default='inline,thread,process')
+    args = parser.parse_args()
+
+    await seed_user()
+
+    for mode in args.modes.split(','):
+        with contextlib.redirect_stdout(io.StringIO()):  # the request log middleware prints every request
+            idle, busy, logins = await run(mode, args.concurrency, args.seconds)
+
+        print(f'{mode:8} probe idle   {percentiles(idle)}')
+        print(f'{mode:8} probe storm  {percentiles(busy)}')
+        print(f'{mode:8} logins       {percentiles(logins)} {len(logins) / args.seconds:.1f}/s')
+        print(f'{mode:8} hashing pool {password_hasher.snapshot()}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Throughput of the notification consumer as its concurrency grows, against a local fake
+broker and a webhook which takes --webhook-ms to answer.
+
+--messages notifications across --books books are queued up front, then drained by a
+consumer with each --concurrency in turn. Every receive, complete and lock renewal waits
+--broker-ms on the fake broker, a receive costs nothing with --prefetch. With --ordered
+the reviews of a book are handled one at a time, so at most --books workers are busy.
+
+    python -m benchmarks.notification_consumer --messages 500 --webhook-ms 50 --concurrency 1 4 16 32
+"""
+from benchmarks import percentiles
+from src.notifications.consumer import NotificationConsumer
+from src.tests.fakes import FakeServiceBus
+import argparse
+import asyncio
+import time
+
+
+class SlowWebhookConsumer(NotificationConsumer):
+    def __init__(self, webhook_latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.webhook_latency = webhook_latency
+        self.timings = []
+
+    async def invoke_webhook(self, book_name: str, review_content: str):
+        start = time.perf_counter()
+        await asyncio.sleep(self.webhook_latency)
+        self.timings.append(time.perf_counter() - start)
+
+
+async def drain(args, concurrency: int) -> tuple:
+    bus = FakeServiceBus(send_latency=args.broker_ms / 1000)
+    bus.queues['reviews'] = [f'Book {i % args.books}|review {i}' for i in range(args.messages)]
+    consumer = SlowWebhookConsumer(args.webhook_ms / 1000, concurrency=concurrency, prefetch=args.prefetch,
+                                   ordered=args.ordered, lock_renewal_interval=args.renewal,
+                                   client_factory=bus.from_connection_string)
+    consumer.queue_name = 'reviews'
+
+    start = time.perf_counter()
+    task = asyncio.create_task(consumer.process_messages())
+    while len(bus.completed) < args.messages and not task.done():
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    return consumer, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--books', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--prefetch', type=int, default=0)
+    parser.add_argument('--ordered', action='store_true', help='one book at a time')
+    parser.add_argument('--renewal', type=float, default=20, help='seconds between lock renewals, 0 for none')
+    parser.add_argument('--webhook-ms', type=float, default=50, help='response time of the webhook')
+    parser.add_argument('--broker-ms', type=float, default=2, help='round trip of a receive or settlement')
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        consumer, elapsed = await drain(args, concurrency)
+        print(f'concurrency={concurrency:<4} {args.messages / elapsed:8.0f} msg/s '
+              f'avg_handle_ms={consumer.snapshot()["avg_handle_ms"]:<8} webhook {percentiles(consumer.timings)}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
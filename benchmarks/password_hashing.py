@@ -0,0 +1,54 @@
+"""
+Password hashes per second and per core for candidate hash settings.
+
+Hashes on a single thread, so each figure is what one core of a worker sustains;
+multiply by the cores given to PASSWORD_HASH_WORKERS to get the login throughput
+of a worker. Verifying costs the same as hashing, so logins/s per core is the
+same number. Pick the highest cost whose throughput still covers the peak login
+rate with headroom.
+
+    python -m benchmarks.password_hashing --seconds 2 --cores 4
+"""
+from src.auth.utils import create_passwd_context
+import argparse
+import time
+
+CONFIGURATIONS = [  # (label, create_passwd_context arguments)
+    ('bcrypt rounds=10', {'scheme': 'bcrypt', 'bcrypt_rounds': 10}),
+    ('bcrypt rounds=11', {'scheme': 'bcrypt', 'bcrypt_rounds': 11}),
+    ('bcrypt rounds=12', {'scheme': 'bcrypt', 'bcrypt_rounds': 12}),
+    ('bcrypt rounds=13', {'scheme': 'bcrypt', 'bcrypt_rounds': 13}),
+    ('argon2id t=2 m=19MiB', {'scheme': 'argon2', 'argon2_time_cost': 2, 'argon2_memory_cost': 19456}),
+    ('argon2id t=3 m=12MiB', {'scheme': 'argon2', 'argon2_time_cost': 3, 'argon2_memory_cost': 12288}),
+    ('argon2id t=1 m=47MiB', {'scheme': 'argon2', 'argon2_time_cost': 1, 'argon2_memory_cost': 47104}),
+    ('argon2id t=3 m=64MiB', {'scheme': 'argon2', 'argon2_time_cost': 3, 'argon2_memory_cost': 65536}),
+]
+
+
+def measure(context, seconds: float) -> float:
+    """Seconds per hash, averaged over as many hashes as fit in `seconds` (at least 3)"""
+    context.hash('warm-up')  # loads the backend
+
+    hashes = 0
+    start = time.perf_counter()
+    while hashes < 3 or time.perf_counter() - start < seconds:
+        context.hash('correct horse battery staple')
+        hashes += 1
+
+    return (time.perf_counter() - start) / hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=2, help='time spent on every configuration')
+    parser.add_argument('--cores', type=int, default=1, help='cores of a worker given to hashing')
+    args = parser.parse_args()
+
+    print(f"{'configuration':24} {'ms/hash':>9} {'hashes/s/core':>14} {f'logins/s x{args.cores}':>14}")
+    for label, settings in CONFIGURATIONS:
+        per_hash = measure(create_passwd_context(**settings), args.seconds)
+        print(f'{label:24} {per_hash * 1000:9.1f} {1 / per_hash:14.1f} {args.cores / per_hash:14.1f}')
+
+
+if __name__ == '__main__':
+    main()
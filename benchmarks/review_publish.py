@@ -0,0 +1,92 @@
+"""
+Service Bus publish overhead of one review notification, against a local fake broker.
+
+Compares a client and sender built for every message (what the review route did
+before) with the process wide sender of src.notifications.publisher, then a spike of
+--spike concurrent notifications sent one by one on that sender against the same spike
+coalesced by src.notifications.batching. The fake broker
+waits --connect-ms on every new connection and --send-ms on every send, so only the
+shape of the costs is real; measure the latencies of your namespace and pass them in.
+
+    python -m benchmarks.review_publish --messages 200 --spike 1000 --connect-ms 40 --send-ms 3
+"""
+from benchmarks import percentiles
+from src.notifications.batching import MessageBatcher
+from src.notifications.publisher import ServiceBusPublisher
+from src.tests.fakes import FakeServiceBus
+from azure.servicebus import ServiceBusMessage
+import argparse
+import asyncio
+import time
+
+
+async def per_message_client(bus: FakeServiceBus, messages: int) -> list:
+    timings = []
+
+    for i in range(messages):
+        start = time.perf_counter()
+        publisher = ServiceBusPublisher('fake', 'reviews', client_factory=bus.from_connection_string)
+        await publisher.send(ServiceBusMessage(f'Dune|review {i}'))
+        await publisher.close()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+async def shared_sender(bus: FakeServiceBus, messages: int) -> list:
+    publisher = ServiceBusPublisher('fake', 'reviews', client_factory=bus.from_connection_string)
+    await publisher.start()  # done once in the app startup
+    timings = []
+
+    for i in range(messages):
+        start = time.perf_counter()
+        await publisher.send(ServiceBusMessage(f'Dune|review {i}'))
+        timings.append(time.perf_counter() - start)
+
+    await publisher.close()
+
+    return timings
+
+
+async def spike(bus: FakeServiceBus, messages: int, batched: bool) -> list:
+    publisher = ServiceBusPublisher('fake', 'reviews', client_factory=bus.from_connection_string)
+    await publisher.start()
+    batcher = MessageBatcher(publisher)
+    publish = batcher.publish if batched else publisher.send
+
+    async def timed(i: int) -> float:
+        start = time.perf_counter()
+        await publish(ServiceBusMessage(f'Dune|review {i}'))
+        return time.perf_counter() - start
+
+    timings = await asyncio.gather(*[timed(i) for i in range(messages)])
+
+    await batcher.close()
+    await publisher.close()
+
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--spike', type=int, default=1000, help='notifications published at once')
+    parser.add_argument('--connect-ms', type=float, default=40, help='connect, auth and link attach of the broker')
+    parser.add_argument('--send-ms', type=float, default=3, help='round trip of one send')
+    args = parser.parse_args()
+
+    for label, publish in (('client per message', per_message_client), ('shared sender', shared_sender)):
+        bus = FakeServiceBus(connect_latency=args.connect_ms / 1000, send_latency=args.send_ms / 1000)
+        timings = await publish(bus, args.messages)
+        print(f'{label:20} connects={bus.connects:<5} {percentiles(timings)}')
+
+    for label, batched in (('spike, one by one', False), ('spike, batched', True)):
+        bus = FakeServiceBus(connect_latency=args.connect_ms / 1000, send_latency=args.send_ms / 1000)
+        start = time.perf_counter()
+        timings = await spike(bus, args.spike, batched)
+        elapsed = time.perf_counter() - start
+        print(f'{label:20} sends={bus.sends:<5} {args.spike / elapsed:.0f} msg/s {percentiles(timings)}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
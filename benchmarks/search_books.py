@@ -0,0 +1,113 @@
+"""
+Full text search latency on a large catalog.
+
+Seeds the books table of DATABASE_URL up to --books rows with generated titles,
+authors, publishers and tags, then times BookService.search_books. Point it at a
+scratch database with the migrations applied; the rows are left in place so
+later runs skip the seeding.
+
+    python -m benchmarks.search_books --books 1000000 --repeat 20
+"""
+from benchmarks import percentiles
+from src.books.service import BookService
+from src.cache import NullCache
+from src.db.main import async_session
+from sqlalchemy import text
+import argparse
+import asyncio
+import time
+
+WORDS = ['lord', 'ring', 'shadow', 'night', 'river', 'garden', 'winter', 'empire', 'silent', 'glass', 'storm',
+         'harbor', 'dragon', 'letters', 'secret', 'history', 'kingdom', 'ocean', 'iron', 'forest']
+QUERIES = [
+    'lord',  # common word, matches one book in twenty
+    'sha',  # prefix of a common word
+    'kw4242',  # rare word, a few hundred books
+    'kw42',  # prefix of a hundred rare words
+    'lord kw4242',  # common and rare word together
+    'dragon',  # also the name of a tag
+    'lord dragon',  # a title word and a tag, matched across the two
+]
+
+SEED_BOOKS = text("""
+    INSERT INTO books (uid, title, author, publisher, published_date, page_count, language, created_at, updated_at)
+    SELECT gen_random_uuid(),
+           initcap(w[1 + i % 20]) || ' ' || 'kw' || (i::bigint * 7919) % 10000 || ' ' || 'kw' || (i::bigint * 104729) % 10000,
+           'Author ' || (i % 50000),
+           'Publisher ' || (i % 500),
+           date '1950-01-01' + (i % 25000),
+           50 + i % 900,
+           (ARRAY['en', 'fr', 'de', 'es'])[1 + i % 4],
+           now() - (i || ' seconds')::interval,
+           now()
+    FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i, CAST(:words AS text[]) AS w
+""")
+
+SEED_TAGS = text("""
+    INSERT INTO tags (uid, name, created_at, updated_at)
+    SELECT gen_random_uuid(), w, now(), now() FROM unnest(CAST(:words AS text[])) AS w
+    WHERE NOT EXISTS (SELECT 1 FROM tags WHERE tags.name = w)
+""")
+
+LINK_TAGS = text("""
+    INSERT INTO booktag (book_id, tag_id)
+    SELECT b.uid, t.uid FROM (SELECT uid FROM books TABLESAMPLE SYSTEM (1)) b
+    CROSS JOIN LATERAL (SELECT uid FROM tags WHERE b.uid IS NOT NULL ORDER BY random() LIMIT 1) t  -- one draw per book
+    ON CONFLICT DO NOTHING
+""")
+
+
+async def seed(target: int, batch: int = 100000):
+    async with async_session() as session:
+        existing = (await session.exec(text('SELECT count(*) FROM books'))).one()[0]
+
+        for start in range(existing + 1, target + 1, batch):
+            stop = min(start + batch - 1, target)
+            await session.exec(SEED_BOOKS, params={'words': WORDS, 'start': start, 'stop': stop})
+            await session.commit()
+            print(f'seeded {stop} books')
+
+        if existing < target:
+            await session.exec(SEED_TAGS, params={'words': WORDS})
+            await session.exec(LINK_TAGS)
+            await session.commit()
+            await session.exec(text('ANALYZE books'))
+            await session.exec(text('ANALYZE booktag'))
+            await session.commit()
+
+
+async def run(repeat: int, limit: int):
+    book_service = BookService(cache=NullCache())
+
+    async with async_session() as session:
+        for query in QUERIES:
+            first_page, next_page = [], []
+
+            for _ in range(repeat):
+                start = time.perf_counter()
+                page = await book_service.search_books(query, session, limit=limit)
+                first_page.append(time.perf_counter() - start)
+
+                if page.next_cursor:
+                    start = time.perf_counter()
+                    await book_service.search_books(query, session, limit=limit, cursor=page.next_cursor)
+                    next_page.append(time.perf_counter() - start)
+
+            print(f'{query!r:16} first page  {percentiles(first_page)}')
+            if next_page:
+                print(f'{query!r:16} second page {percentiles(next_page)}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20, help='runs of every query')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    await seed(args.books)
+    await run(args.repeat, args.limit)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
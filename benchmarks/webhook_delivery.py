@@ -0,0 +1,93 @@
+"""
+Webhook delivery latency of the notification consumer, against a local webhook stub.
+
+Compares a client opened for every message (what invoke_webhook did before) with the
+consumer's pooled client, for --messages deliveries made --concurrency at a time. The
+stub waits --connect-ms on every new connection, standing in for the DNS lookup, TCP
+connect and TLS handshake of a remote webhook, and --respond-ms on every request.
+
+    python -m benchmarks.webhook_delivery --messages 500 --concurrency 8 --connect-ms 30 --respond-ms 5
+"""
+from benchmarks import percentiles
+from src.notifications.consumer import NotificationConsumer
+import argparse
+import asyncio
+import httpx
+import time
+
+
+class WebhookStub:
+    """Answers 200 to every POST, keeping the connection open for the next one"""
+
+    def __init__(self, connect_latency: float, respond_latency: float):
+        self.connect_latency = connect_latency
+        self.respond_latency = respond_latency
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.connect_latency)
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = next((int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                               if line.lower().startswith(b'content-length:')), 0)
+                await reader.readexactly(length)
+                await asyncio.sleep(self.respond_latency)
+                self.requests += 1
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class ClientPerMessageConsumer(NotificationConsumer):
+    async def invoke_webhook(self, book_name: str, review_content: str):
+        async with httpx.AsyncClient() as client:
+            payload = {"book_title": book_name, "message": f"New review added: {review_content}"}
+            await client.post(self.webhook_url, json=payload)
+
+
+async def deliver(consumer: NotificationConsumer, messages: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i: int) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await consumer.invoke_webhook('Dune', f'review {i}')
+            return time.perf_counter() - start
+
+    timings = await asyncio.gather(*[timed(i) for i in range(messages)])
+    await consumer.close()
+
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8, help='deliveries in flight, the consumer workers')
+    parser.add_argument('--connect-ms', type=float, default=30, help='cost of opening a connection to the webhook')
+    parser.add_argument('--respond-ms', type=float, default=5, help='response time of the webhook')
+    args = parser.parse_args()
+
+    for label, consumer_class in (('client per message', ClientPerMessageConsumer), ('pooled client', NotificationConsumer)):
+        stub = WebhookStub(args.connect_ms / 1000, args.respond_ms / 1000)
+        server = await asyncio.start_server(stub.handle, '127.0.0.1', 0)
+        consumer = consumer_class(concurrency=args.concurrency)
+        consumer.webhook_url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}/webhook'
+
+        start = time.perf_counter()
+        timings = await deliver(consumer, args.messages, args.concurrency)
+        elapsed = time.perf_counter() - start
+        server.close()
+        await server.wait_closed()
+
+        print(f'{label:20} connections={stub.connections:<5} {args.messages / elapsed:6.0f} msg/s {percentiles(timings)}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+"""books keyset pagination index
+
+Revision ID: 35f68375307a
+Revises: 227cf5d929cb
+Create Date: 2026-10-18 09:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '35f68375307a'
+down_revision: Union[str, None] = '227cf5d929cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_books_created_at_uid', 'books', ['created_at', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_created_at_uid', table_name='books')
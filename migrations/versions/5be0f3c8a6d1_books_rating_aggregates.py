@@ -0,0 +1,36 @@
+"""books rating aggregates
+
+Revision ID: 5be0f3c8a6d1
+Revises: c41d7e9a0b52
+Create Date: 2026-10-18 14:02:55.190264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5be0f3c8a6d1'
+down_revision: Union[str, None] = 'c41d7e9a0b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # constant defaults, no table rewrite; fill them with python -m src.books.aggregates
+    op.add_column('books', sa.Column('review_count', postgresql.INTEGER(), server_default='0', nullable=False))
+    op.add_column('books', sa.Column('rating_sum', postgresql.INTEGER(), server_default='0', nullable=False))
+    op.add_column('books', sa.Column('rating_avg', postgresql.DOUBLE_PRECISION(), server_default='0', nullable=False))
+    op.create_index('ix_books_rating_avg_uid', 'books', ['rating_avg', 'uid'], unique=False)
+    op.create_index('ix_books_review_count_uid', 'books', ['review_count', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_review_count_uid', table_name='books')
+    op.drop_index('ix_books_rating_avg_uid', table_name='books')
+    op.drop_column('books', 'rating_avg')
+    op.drop_column('books', 'rating_sum')
+    op.drop_column('books', 'review_count')
@@ -0,0 +1,39 @@
+"""books full text search
+
+Revision ID: 756ad9c13a40
+Revises: 8f44a1256b5e
+Create Date: 2026-10-18 11:27:05.913472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '756ad9c13a40'
+down_revision: Union[str, None] = '8f44a1256b5e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 'simple' does not stem, titles and names come in many languages and prefix matching covers word endings
+    op.execute("""
+        ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(publisher, '')), 'C')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)")
+    op.execute("CREATE INDEX ix_tags_name_search ON tags USING GIN (to_tsvector('simple', name))")
+    op.create_index('ix_booktag_tag_id', 'booktag', ['tag_id'], unique=False)  # from a matching tag to its books
+
+
+def downgrade() -> None:
+    op.drop_index('ix_booktag_tag_id', table_name='booktag')
+    op.execute("DROP INDEX ix_tags_name_search")
+    op.execute("DROP INDEX ix_books_search_vector")
+    op.drop_column('books', 'search_vector')
@@ -0,0 +1,50 @@
+"""table versions for etags
+
+Revision ID: 8f44a1256b5e
+Revises: 35f68375307a
+Create Date: 2026-10-18 10:03:17.582044
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f44a1256b5e'
+down_revision: Union[str, None] = '35f68375307a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('books', 'tags')
+
+
+def upgrade() -> None:
+    op.create_table('table_versions',
+    sa.Column('name', sa.VARCHAR(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("""
+        CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in VERSIONED_TABLES:
+        op.execute(f"INSERT INTO table_versions (name, version) VALUES ('{table}', 0)")
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
+
+
+def downgrade() -> None:
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_bump_version ON {table}")
+    op.execute("DROP FUNCTION bump_table_version()")
+    op.drop_table('table_versions')
@@ -0,0 +1,28 @@
+"""users unique lower email
+
+Revision ID: 9a6c2f4e71d3
+Revises: e27a94c1d08b
+Create Date: 2026-10-18 17:40:12.903575
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6c2f4e71d3'
+down_revision: Union[str, None] = 'e27a94c1d08b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # fails on emails differing only by case or spaces, merge those accounts by hand first
+    op.execute("UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email))")
+    op.create_index('ux_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_users_email_lower', table_name='users')
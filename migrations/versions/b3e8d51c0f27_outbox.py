@@ -0,0 +1,31 @@
+"""outbox
+
+Revision ID: b3e8d51c0f27
+Revises: 9a6c2f4e71d3
+Create Date: 2026-10-18 19:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d51c0f27'
+down_revision: Union[str, None] = '9a6c2f4e71d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+    sa.Column('id', sa.BIGINT(), autoincrement=True, nullable=False),
+    sa.Column('body', sa.TEXT(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('outbox')
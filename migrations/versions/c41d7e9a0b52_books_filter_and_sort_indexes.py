@@ -0,0 +1,51 @@
+"""books filter and sort indexes
+
+Revision ID: c41d7e9a0b52
+Revises: 756ad9c13a40
+Create Date: 2026-10-18 13:21:08.417293
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9a0b52'
+down_revision: Union[str, None] = '756ad9c13a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BOOK_INDEXES = {
+    'ix_books_user_uid_created_at_uid': ['user_uid', 'created_at', 'uid'],
+    'ix_books_language_created_at_uid': ['language', 'created_at', 'uid'],
+    'ix_books_title_uid': ['title', 'uid'],
+    'ix_books_author_uid': ['author', 'uid'],
+    'ix_books_publisher_uid': ['publisher', 'uid'],
+    'ix_books_published_date_uid': ['published_date', 'uid'],
+    'ix_books_page_count_uid': ['page_count', 'uid'],
+}
+
+
+def upgrade() -> None:
+    for name, columns in BOOK_INDEXES.items():
+        op.create_index(name, 'books', columns, unique=False)
+    op.create_index('ix_reviews_book_uid_rating', 'reviews', ['book_uid', 'rating'], unique=False)
+    op.create_index('ix_tags_name', 'tags', ['name'], unique=False)
+    # listings sorted or filtered by rating change with the reviews
+    op.execute("INSERT INTO table_versions (name, version) VALUES ('reviews', 0)")
+    op.execute("""
+        CREATE TRIGGER reviews_bump_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON reviews
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER reviews_bump_version ON reviews")
+    op.execute("DELETE FROM table_versions WHERE name = 'reviews'")
+    op.drop_index('ix_tags_name', table_name='tags')
+    op.drop_index('ix_reviews_book_uid_rating', table_name='reviews')
+    for name in reversed(list(BOOK_INDEXES)):
+        op.drop_index(name, table_name='books')
@@ -0,0 +1,33 @@
+"""booktag table version
+
+Revision ID: d7f2a9c4e813
+Revises: b3e8d51c0f27
+Create Date: 2026-10-18 21:04:37.152806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f2a9c4e813'
+down_revision: Union[str, None] = 'b3e8d51c0f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # listings filtered by tag change when a tag is attached to or removed from a book
+    op.execute("INSERT INTO table_versions (name, version) VALUES ('booktag', 0)")
+    op.execute("""
+        CREATE TRIGGER booktag_bump_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON booktag
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER booktag_bump_version ON booktag")
+    op.execute("DELETE FROM table_versions WHERE name = 'booktag'")
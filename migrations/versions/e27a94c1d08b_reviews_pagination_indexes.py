@@ -0,0 +1,30 @@
+"""reviews pagination indexes
+
+Revision ID: e27a94c1d08b
+Revises: 5be0f3c8a6d1
+Create Date: 2026-10-18 15:11:32.648120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e27a94c1d08b'
+down_revision: Union[str, None] = '5be0f3c8a6d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_reviews_book_uid_rating', table_name='reviews')
+    op.create_index('ix_reviews_book_uid_rating_uid', 'reviews', ['book_uid', 'rating', 'uid'], unique=False)
+    op.create_index('ix_reviews_book_uid_created_at_uid', 'reviews', ['book_uid', 'created_at', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reviews_book_uid_created_at_uid', table_name='reviews')
+    op.drop_index('ix_reviews_book_uid_rating_uid', table_name='reviews')
+    op.create_index('ix_reviews_book_uid_rating', 'reviews', ['book_uid', 'rating'], unique=False)
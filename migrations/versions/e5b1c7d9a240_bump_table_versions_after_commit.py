@@ -0,0 +1,53 @@
+"""bump table versions after commit
+
+Revision ID: e5b1c7d9a240
+Revises: d7f2a9c4e813
+Create Date: 2026-10-18 23:41:09.630518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c7d9a240'
+down_revision: Union[str, None] = 'd7f2a9c4e813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('books', 'tags', 'reviews', 'booktag')
+
+
+def upgrade() -> None:
+    # the version row every write updated from a trigger stayed locked until the writer's commit,
+    # serializing the writers; the listing version is now bumped after the commit, the other
+    # ETags are computed from count(*) and max(updated_at) of the rows they cover
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_bump_version ON {table}")
+    op.execute("DROP FUNCTION bump_table_version()")
+    op.execute("DELETE FROM table_versions WHERE name <> 'books'")
+    op.execute("INSERT INTO table_versions (name, version) VALUES ('books', 0) ON CONFLICT (name) DO NOTHING")
+    # a renamed tag changes the ETags of the tag list and of the books carrying it
+    op.add_column('tags', sa.Column('updated_at', postgresql.TIMESTAMP(), nullable=True))
+    op.execute("UPDATE tags SET updated_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column('tags', 'updated_at')
+    op.execute("""
+        CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in VERSIONED_TABLES:
+        op.execute(f"INSERT INTO table_versions (name, version) VALUES ('{table}', 0) ON CONFLICT (name) DO NOTHING")
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
@@ -3,15 +3,18 @@ from src.books.routes import book_router
 from src.auth.routes import auth_router
 from src.reviews.routes import review_router
 from src.tags.routes import tags_router
+from src.metrics.routes import metrics_router
 from .errors import register_all_errors
-import asyncio
 from src.reviews.service import ReviewService
-from src.notifications.consumer import NotificationConsumer
+from src.notifications.consumer import notification_consumer
 from src.config import Config
+from src.auth.utils import password_hasher
+from src.notifications.publisher import notification_publisher
+from src.notifications.outbox import outbox_relay
+from src.notifications.batching import notification_batcher
 from src.middleware import register_middleware
 
 review_service = ReviewService()
-notification_consumer = NotificationConsumer()
 
 version = 'v1'  # This is the version of the API
 version_prefix = f"/api/{version}"
@@ -33,9 +36,25 @@ app = FastAPI(  # our web server
 @app.on_event("startup")
 async def startup_event():
     """
-    Start the Azure Service Bus listener in the background when the application starts.
+    Start the Azure Service Bus listener in the background when the application starts,
+    open the sender the review notifications are published with and start relaying the outbox.
     """
-    asyncio.create_task(notification_consumer.process_messages())
+    notification_consumer.start()
+    await notification_publisher.start()
+    outbox_relay.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stop the password hashing workers, the outbox relay and the consumer, close the Service Bus
+    sender and the connections to the webhook.
+    """
+    password_hasher.shutdown()
+    await notification_consumer.stop()
+    await outbox_relay.stop()
+    await notification_batcher.close()
+    await notification_publisher.close()
 
 
 register_all_errors(app)
@@ -46,3 +65,4 @@ app.include_router(book_router, prefix=f"{version_prefix}/books", tags=['books']
 app.include_router(auth_router, prefix=f"{version_prefix}/auth", tags=['auth'])
 app.include_router(review_router, prefix=f"{version_prefix}/reviews", tags=['reviews'])
 app.include_router(tags_router, prefix=f"{version_prefix}/tags", tags=["tags"])
+app.include_router(metrics_router, prefix=f"{version_prefix}/metrics", tags=["metrics"])
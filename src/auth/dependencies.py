@@ -2,17 +2,18 @@ from fastapi import Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .utils import decode_token
 from src.db.blocklist import token_in_blocklist
-from src.db.main import get_session
+from src.db.main import get_read_session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from .service import UserService
 from typing import List
-from src.db.models import User
+from src.config import Config
 from src.errors import (
     InvalidToken,
     RefreshTokenRequired,
     AccessTokenRequired,
     InsufficientPermission,
-    AccountNotVerified
+    AccountNotVerified,
+    UserNotFound
 )
 
 user_service = UserService()
@@ -30,24 +31,33 @@ class TokenBearer(HTTPBearer):
 
         token = creds.credentials  # to give access to our token
 
+        token_data = await self.verified_token_data(request, token)
+
+        self.verify_token_data(token_data)
+
+        return token_data
+
+    async def verified_token_data(self, request: Request, token: str) -> dict:
+        """
+        Decode the token and check the blocklist once per request. Every bearer of a route
+        (the route's own and the one behind get_current_user) shares the result through request.state.
+        """
+        verified = getattr(request.state, 'verified_token', None)
+        if verified is not None and verified[0] == token:
+            return verified[1]
+
         token_data = decode_token(token)
 
-        if not self.token_valid(token):
+        if token_data is None:  # invalid signature, expired or malformed
             raise InvalidToken()
 
         if await token_in_blocklist(token_data['jti']):
             raise InvalidToken()
 
-        self.verify_token_data(token_data)
+        request.state.verified_token = (token, token_data)
 
         return token_data
 
-    def token_valid(self, token: str) -> bool:  # func to check whether our token is valid
-
-        token_data = decode_token(token)
-
-        return token_data is not None  # return True if it's not None else it will return False
-
     def verify_token_data(self, token_data):
         raise NotImplementedError(
             "Please Override this method in child classes")  # throwing an error if this method is not override
@@ -71,7 +81,7 @@ class RefreshTokenBearer(TokenBearer):  # func to create dependency
 
 
 async def get_current_user(token_details: dict = Depends(AccessTokenBearer()),  # identify the user from the token
-                           session: AsyncSession = Depends(get_session)
+                           session: AsyncSession = Depends(get_read_session)  # replica on GET, primary on writes
                            ):
     user_email = token_details['user']['email']  # extracts the user's email from the token_details
 
@@ -85,11 +95,22 @@ class RoleChecker:
     def __init__(self, allowed_roles: List[str]) -> None:
         self.allowed_roles = allowed_roles  # These will be the roles that are authorized to perform a certain action
 
-    def __call__(self, current_user: User = Depends(get_current_user)):
-        if not current_user.is_verified:  # check if user hasn't verified his account yet
+    async def __call__(self, token_details: dict = Depends(AccessTokenBearer()),
+                       session: AsyncSession = Depends(get_read_session)):
+        claims = token_details['user']
+
+        # the user is looked up (through a short lived cache) for tokens issued without the claims, and for
+        # accounts verified after the login, as verification only ever goes one way
+        if Config.AUTHORIZATION_MODE != 'claims' or 'role' not in claims or not claims.get('is_verified'):
+            claims = await user_service.get_user_claims(claims['email'], session)
+
+            if claims is None:  # the account was deleted after the token was issued
+                raise UserNotFound()
+
+        if not claims['is_verified']:  # check if user hasn't verified his account yet
             raise AccountNotVerified
 
-        if current_user.role in self.allowed_roles:  # check if the user’s role is valid
+        if claims['role'] in self.allowed_roles:  # check if the user’s role is valid
             return True  # indicating the user has permission
 
         raise InsufficientPermission()
@@ -0,0 +1,100 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from src.errors import PasswordHashingOverloaded
+import asyncio
+import time
+import os
+
+
+class PasswordHasher:
+    """
+    Runs the deliberately slow password hash functions on a bounded pool of threads or
+    processes, so a burst of logins never blocks the event loop of the worker.
+    At most `workers` hashes run at once, the callers past that wait in a queue of at
+    most `max_queue` (0 for no limit) and the next ones are turned away.
+    """
+
+    def __init__(self, executor: str = 'thread', workers: int = 0, max_queue: int = 100):
+        self.executor_type = executor  # 'thread', 'process' or 'inline' (on the event loop, for comparisons only)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None  # created on first use, a process pool must not fork at import time
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.queued = 0  # callers waiting for a free worker
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0  # callers turned away because the queue was full
+        self.max_queued = 0
+        self.total_wait = 0.0  # seconds spent queued
+        self.max_wait = 0.0
+        self.total_run = 0.0  # seconds spent hashing
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # asyncio primitives belong to the loop they were first used on
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._semaphore
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == 'process':  # no GIL contention, but every call pickles its arguments
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    async def run(self, function: Callable[..., Any], *args) -> Any:
+        if self.executor_type == 'inline':
+            return function(*args)
+
+        if self.max_queue and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingOverloaded()
+
+        semaphore = self._get_semaphore()
+
+        start = time.perf_counter()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started = time.perf_counter()
+        self.total_wait += started - start
+        self.max_wait = max(self.max_wait, started - start)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), function, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run += time.perf_counter() - started
+            semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            'pid': os.getpid(),  # every uvicorn worker owns its own pool
+            'executor': self.executor_type,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'running': self.running,
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(self.total_wait / self.completed * 1000, 3) if self.completed else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'avg_hash_ms': round(self.total_run / self.completed * 1000, 3) if self.completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,147 @@
+"""
+Keys the tokens are signed and verified with.
+
+    python -m src.auth.keys generate --type ed25519 --out keys/2026-10.pem
+
+writes a new private key and prints its kid. Sign with it through JWT_SIGNING_KEY and
+keep the previous key's file in JWT_VERIFICATION_KEYS until the tokens it signed expire.
+"""
+from typing import Dict, List, Optional, Tuple
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from src.config import Config
+import argparse
+import base64
+import hashlib
+import json
+
+JWK_THUMBPRINT_MEMBERS = {'RSA': ('e', 'kty', 'n'), 'OKP': ('crv', 'kty', 'x')}
+
+
+def _public_jwk(public_key) -> Tuple[str, dict]:
+    """Algorithm to sign with and the JWK of a parsed public key"""
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return 'RS256', RSAAlgorithm.to_jwk(public_key, as_dict=True)
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return 'EdDSA', OKPAlgorithm.to_jwk(public_key, as_dict=True)
+
+    raise ValueError(f"Unsupported JWT key type {type(public_key).__name__}, use an RSA or Ed25519 key")
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    """RFC 7638 thumbprint, the kid of a key, so the same key always gets the same kid"""
+    members = {name: jwk[name] for name in JWK_THUMBPRINT_MEMBERS[jwk['kty']]}
+    digest = hashlib.sha256(json.dumps(members, separators=(',', ':'), sort_keys=True).encode('utf-8')).digest()
+
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+class KeyRing:
+    """
+    The key new tokens are signed with and every key a token may still be verified with,
+    by kid. Keys are parsed once, jwt.encode and jwt.decode get the parsed objects.
+    """
+
+    def __init__(self):
+        self.signing_key = None
+        self.signing_kid: Optional[str] = None
+        self.algorithm: Optional[str] = None
+        self.verification_keys: Dict[str, Tuple[object, str]] = {}  # kid -> (public key, algorithm)
+        self.legacy_key: Optional[Tuple[str, str]] = None  # (secret, algorithm) for tokens without a kid
+        self._jwks: List[dict] = []
+
+    def add_public_key(self, public_key) -> str:
+        algorithm, jwk = _public_jwk(public_key)
+        kid = jwk_thumbprint(jwk)
+
+        self.verification_keys[kid] = (public_key, algorithm)
+        self._jwks.append({**jwk, 'kid': kid, 'alg': algorithm, 'use': 'sig'})
+
+        return kid
+
+    def set_signing_key(self, private_key) -> str:
+        self.signing_kid = self.add_public_key(private_key.public_key())
+        self.signing_key = private_key
+        self.algorithm = self.verification_keys[self.signing_kid][1]
+
+        return self.signing_kid
+
+    def set_legacy_secret(self, secret: str, algorithm: str) -> None:
+        """Verify the tokens without a kid with JWT_SECRET, and sign with it when no key pair is configured"""
+        self.legacy_key = (secret, algorithm)
+        if self.signing_key is None:
+            self.signing_key, self.algorithm = secret, algorithm
+
+    def headers(self) -> Optional[dict]:
+        return {'kid': self.signing_kid} if self.signing_kid else None
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Tuple[object, str]]:
+        """Key and algorithm to verify a token with, None for an unknown kid"""
+        if kid is None:
+            return self.legacy_key
+
+        return self.verification_keys.get(kid)
+
+    def jwks(self) -> dict:
+        """Public keys in JWK Set form, for the services verifying our tokens on their own"""
+        return {'keys': self._jwks}
+
+
+def _read(path: str) -> bytes:
+    with open(path.strip(), 'rb') as key_file:
+        return key_file.read()
+
+
+def load_key_ring() -> KeyRing:
+    key_ring = KeyRing()
+
+    if Config.JWT_SIGNING_KEY:
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+        key_ring.set_signing_key(load_pem_private_key(_read(Config.JWT_SIGNING_KEY), password=None))
+
+        for path in filter(str.strip, Config.JWT_VERIFICATION_KEYS.split(',')):
+            pem = _read(path)
+            if b'PRIVATE KEY' in pem:  # the file of a previous signing key works as is
+                key_ring.add_public_key(load_pem_private_key(pem, password=None).public_key())
+            else:
+                key_ring.add_public_key(load_pem_public_key(pem))
+
+    if key_ring.signing_key is None or Config.JWT_ACCEPT_SECRET_SIGNED:  # tokens issued before the switch
+        key_ring.set_legacy_secret(Config.JWT_SECRET, Config.JWT_ALGORITHM)
+
+    return key_ring
+
+
+def generate_key(key_type: str):
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if key_type == 'rsa':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+def main():
+    from cryptography.hazmat.primitives import serialization
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate = subparsers.add_parser('generate', help='write a new private key and print its kid')
+    generate.add_argument('--type', choices=['ed25519', 'rsa'], default='ed25519')
+    generate.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    private_key = generate_key(args.type)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    with open(args.out, 'xb') as key_file:  # never overwrite a key which may still be in use
+        key_file.write(pem)
+
+    print(KeyRing().add_public_key(private_key.public_key()))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi.responses import JSONResponse
 from src.db.blocklist import add_jti_to_blocklist
 from src.config import Config
-from src.db.main import get_session
+from src.db.main import get_session, get_read_session
 from fastapi import (
     APIRouter,
     Depends,
@@ -14,7 +14,6 @@ from fastapi import (
 from .dependencies import (
     RefreshTokenBearer,
     AccessTokenBearer,
-    get_current_user,
     RoleChecker
 )
 from .schemas import (
@@ -27,10 +26,11 @@ from .schemas import (
 )
 from .utils import (
     create_access_token,
-    verify_password,
+    verify_and_update_password,
     create_url_safe_token,
     decode_url_safe_token,
-    generate_password_hash
+    generate_password_hash,
+    key_ring
 )
 from src.errors import (
     UserAlreadyExists,
@@ -133,16 +133,21 @@ async def login_users(login_data: UserLoginModel, session: AsyncSession = Depend
     password = login_data.password
 
     user = await user_service.get_user_by_email(email, session)  # to check if user exists
+    await session.close()  # give the connection back to the pool, a login may queue for the password hasher
 
     if user:  # check if the password matches the password in our database
-        password_valid = verify_password(password, user.password_hash)  # return bool if the pass matches
+        password_valid, new_hash = await verify_and_update_password(password, user.password_hash)  # return bool if the pass matches
+
+        if password_valid and new_hash is not None:  # hashed with an older scheme or cost, store the upgrade
+            await user_service.update_password_hash(user.uid, new_hash, session)
 
         if password_valid:
             access_token = create_access_token(
                 user_data={
                     'email': user.email,
                     'user_uid': str(user.uid),
-                    'role': user.role
+                    'role': user.role,
+                    'is_verified': user.is_verified  # claims checked by RoleChecker instead of a user lookup
                 }
             )
 
@@ -171,12 +176,18 @@ async def login_users(login_data: UserLoginModel, session: AsyncSession = Depend
 
 
 @auth_router.get('/refresh_token')  # func to generate new access token in case we provide a valid refresh token
-async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer())):
+async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer()),
+                               session: AsyncSession = Depends(get_read_session)):
     expiry_timestamp = token_details['exp']
     # we need to convert our timestamp to a datetime object
     if datetime.fromtimestamp(expiry_timestamp) > datetime.now():
+        claims = await user_service.get_user_claims(token_details['user']['email'], session)
+
+        if claims is None:
+            raise UserNotFound()
+
         new_access_token = create_access_token(  # create a new token if the old one is expired
-            user_data=token_details['user']  # to get the same user data for the current user (uid and email)
+            user_data={**token_details['user'], **claims}  # same user (uid and email), current role and verification
         )
         # if we are able to do this, return a JSONResponse
         return JSONResponse(content={
@@ -186,8 +197,26 @@ async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer(
     raise InvalidToken()
 
 
+@auth_router.get('/jwks.json')
+async def get_jwks():
+    """Public keys of the access tokens by kid, to verify them without calling back into this API"""
+    return JSONResponse(
+        content=key_ring.jwks(),
+        headers={'Cache-Control': 'public, max-age=300'}  # a new key is published before it signs anything
+    )
+
+
 @auth_router.get('/me', response_model=UserBooksModel)  # return the current user with a list of his books
-async def get_current_user(user=Depends(get_current_user), _: bool = Depends(role_checker)):
+async def get_current_user(
+        token_details: dict = Depends(AccessTokenBearer()),
+        _: bool = Depends(role_checker),
+        session: AsyncSession = Depends(get_read_session)
+):
+    user = await user_service.get_user_with_books(token_details['user']['email'], session)
+
+    if not user:
+        raise UserNotFound()
+
     return user
 
 
@@ -195,7 +224,7 @@ async def get_current_user(user=Depends(get_current_user), _: bool = Depends(rol
 async def revoke_token(token_data: dict = Depends(AccessTokenBearer())):
     jti = token_data['jti']
 
-    await add_jti_to_blocklist(jti)
+    await add_jti_to_blocklist(jti, token_data['exp'])  # kept only as long as the token would be accepted
 
     return JSONResponse(
         content={
@@ -253,7 +282,7 @@ async def reset_account_password(
         if not user:  # if the user is not found raise an error
             raise UserNotFound()
 
-        password_hash = generate_password_hash(new_password)  # to generate unreadable string of the new password
+        password_hash = await generate_password_hash(new_password)  # to generate unreadable string of the new password
         await user_service.update_user(user, {"password_hash": password_hash},
                                        session)  # update the user with the new password
 
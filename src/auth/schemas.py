@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from .utils import normalize_email
 from src.books.schemas import Book
 from src.reviews.schemas import ReviewModel
 import uuid
@@ -13,6 +14,8 @@ class UserCreateModel(BaseModel):
     email: str = Field(max_length=40)
     password: str = Field(min_length=6)
 
+    _normalize_email = field_validator('email')(normalize_email)
+
 
 class UserModel(BaseModel):  # to return all of the info related to the specific user
     uid: uuid.UUID  # everything is copied from the models except the things related to the database
@@ -35,6 +38,8 @@ class UserLoginModel(BaseModel):
     email: str = Field(max_length=40)
     password: str = Field(min_length=6)
 
+    _normalize_email = field_validator('email')(normalize_email)
+
 
 class EmailModel(BaseModel):
     addresses: List[str]
@@ -43,6 +48,8 @@ class EmailModel(BaseModel):
 class PasswordResetRequestModel(BaseModel):
     email: str
 
+    _normalize_email = field_validator('email')(normalize_email)
+
 
 class PasswordResetConfirmModel(BaseModel):
     new_password: str
@@ -1,13 +1,29 @@
 from src.db.models import User
 from .schemas import UserCreateModel
-from .utils import generate_password_hash
+from .utils import generate_password_hash, normalize_email
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy import exists, func, update
+from sqlalchemy.exc import IntegrityError
+from src.errors import UserAlreadyExists
+from src.cache import LRUTTLCache
+from src.config import Config
+from typing import Optional
+
+
+# role and verification status by email, the fallback of claims based authorization
+user_claims_cache = LRUTTLCache(Config.USER_CACHE_MAX_ENTRIES)
+
+
+def email_is(email: str):
+    """Case insensitive match on the email, served by the ux_users_email_lower index"""
+    return func.lower(User.email) == normalize_email(email)
 
 
 class UserService:
     async def get_user_by_email(self, email: str, session: AsyncSession):
-        statement = select(User).where(User.email == email)
+        statement = select(User).where(email_is(email))
 
         result = await session.exec(statement)
 
@@ -15,10 +31,46 @@ class UserService:
 
         return user
 
+    async def get_user_with_books(self, email: str, session: AsyncSession):
+        """Get a user together with the books and reviews they submitted"""
+        statement = (
+            select(User)
+            .where(email_is(email))
+            .options(selectinload(User.books), selectinload(User.reviews))
+        )
+
+        result = await session.exec(statement)
+
+        return result.first()
+
+    async def get_user_claims(self, email: str, session: AsyncSession) -> Optional[dict]:
+        """The role and is_verified of a user, from a short lived per worker cache when possible"""
+        email = normalize_email(email)
+        claims = user_claims_cache.get(email) if Config.USER_CACHE_TTL else None
+
+        if claims is None:
+            statement = select(User.role, User.is_verified).where(email_is(email))  # the two columns only
+
+            result = await session.exec(statement)
+
+            row = result.first()
+
+            if row is None:
+                return None
+
+            claims = {'role': row.role, 'is_verified': row.is_verified}
+
+            if Config.USER_CACHE_TTL:
+                user_claims_cache.set(email, claims, Config.USER_CACHE_TTL)
+
+        return claims
+
     async def user_exists(self, email, session: AsyncSession):
-        user = await self.get_user_by_email(email, session)
+        statement = select(exists().where(email_is(email)))  # stops at the first index hit, loads no row
 
-        return True if user is not None else False
+        result = await session.exec(statement)
+
+        return result.one()
 
     async def create_user(self, user_data: UserCreateModel, session: AsyncSession):
         user_data_dict = user_data.model_dump()
@@ -27,12 +79,16 @@ class UserService:
             **user_data_dict
         )
 
-        new_user.password_hash = generate_password_hash(user_data_dict['password'])  # to hash the user password
+        new_user.password_hash = await generate_password_hash(user_data_dict['password'])  # to hash the user password
         new_user.role = 'user'
 
         session.add(new_user)
 
-        await session.commit()
+        try:
+            await session.commit()
+        except IntegrityError:  # a concurrent signup with the same email won the race to the unique index
+            await session.rollback()
+            raise UserAlreadyExists()
 
         return new_user
 
@@ -44,4 +100,14 @@ class UserService:
 
         await session.commit()
 
-        return user
\ No newline at end of file
+        user_claims_cache.delete(normalize_email(user.email))  # other workers catch up within USER_CACHE_TTL
+
+        return user
+
+    async def update_password_hash(self, user_uid, password_hash: str, session: AsyncSession):
+        """Replace a password hash without loading the user, e.g. after an upgrade of the hash scheme"""
+        statement = update(User).where(User.uid == user_uid).values(password_hash=password_hash)
+
+        await session.exec(statement)
+
+        await session.commit()
@@ -1,27 +1,92 @@
 from datetime import timedelta, datetime
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from src.config import Config
+from src.cache import LRUTTLCache
+from .hashing import PasswordHasher
+from .keys import load_key_ring
 import jwt
+import hashlib
+import time
 import uuid
 import logging
 from itsdangerous import URLSafeTimedSerializer
 
-passwd_context = CryptContext(
-    schemes=['bcrypt']  # list of the algorithm used to hash the password
-)
+PASSWORD_HASH_SCHEMES = ('bcrypt', 'argon2')
+
+
+def create_passwd_context(
+        scheme: str = Config.PASSWORD_HASH_SCHEME,
+        bcrypt_rounds: int = Config.PASSWORD_BCRYPT_ROUNDS,
+        argon2_time_cost: int = Config.PASSWORD_ARGON2_TIME_COST,
+        argon2_memory_cost: int = Config.PASSWORD_ARGON2_MEMORY_COST,
+        argon2_parallelism: int = Config.PASSWORD_ARGON2_PARALLELISM
+) -> CryptContext:
+    """
+    New hashes use `scheme` at the configured cost. Hashes of the other scheme, or of the same
+    scheme at another cost, still verify but are reported by needs_update so they get replaced.
+    """
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme {scheme!r}, use one of {PASSWORD_HASH_SCHEMES}")
+
+    return CryptContext(
+        schemes=[scheme] + [other for other in PASSWORD_HASH_SCHEMES if other != scheme],  # the first one hashes
+        deprecated='auto',  # every scheme but the first needs an update
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__type='ID',
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism
+    )
+
+
+passwd_context = create_passwd_context()
+
+key_ring = load_key_ring()  # parsed once per worker
 
 ACCESS_TOKEN_EXPIRY = 3600
 
+# signature checks already done, by sha256 of the token; revocation is still checked on every request
+verified_tokens = LRUTTLCache(Config.JWT_CACHE_MAX_ENTRIES) if Config.JWT_CACHE_MAX_ENTRIES else None
+
+
+password_hasher = PasswordHasher(
+    executor=Config.PASSWORD_HASH_EXECUTOR,
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_queue=Config.PASSWORD_HASH_MAX_QUEUE
+)
+
+
+def _hash_password(password: str) -> str:  # module level functions, a process pool pickles them by name
+    return passwd_context.hash(password)
+
+
+def _verify_password(password: str, hash: str) -> bool:
+    return passwd_context.verify(password, hash)
 
-def generate_password_hash(
+
+def _verify_and_update_password(password: str, hash: str) -> Tuple[bool, Optional[str]]:
+    return passwd_context.verify_and_update(password, hash)  # only hashes again when the password matched
+
+
+async def generate_password_hash(
         password: str) -> str:  # to generate unreadable string of the password which will be stored in our database
-    hash = passwd_context.hash(password)
+    hash = await password_hasher.run(_hash_password, password)  # a few hundred ms of CPU, kept off the event loop
 
     return hash
 
 
-def verify_password(password: str, hash: str) -> bool:  # used for log in to verify the password
-    return passwd_context.verify(password, hash)
+async def verify_password(password: str, hash: str) -> bool:  # used for log in to verify the password
+    return await password_hasher.run(_verify_password, password, hash)
+
+
+async def verify_and_update_password(password: str, hash: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password, returning a new hash when the stored one uses an outdated scheme or cost"""
+    return await password_hasher.run(_verify_and_update_password, password, hash)
+
+
+def normalize_email(email: str) -> str:  # emails are stored and looked up in this form
+    return email.strip().lower()
 
 
 def create_access_token(user_data: dict, expiry: timedelta = None, refresh: bool = False) -> str:
@@ -34,21 +99,39 @@ def create_access_token(user_data: dict, expiry: timedelta = None, refresh: bool
 
     token = jwt.encode(
         payload=payload,
-        key=Config.JWT_SECRET,
-        algorithm=Config.JWT_ALGORITHM
+        key=key_ring.signing_key,
+        algorithm=key_ring.algorithm,
+        headers=key_ring.headers()  # the kid tells verifiers which of the published keys to use
     )
 
     return token
 
 
 def decode_token(token: str) -> dict:  # to decode the token and check whether it is valid
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()  # never keep the bearer token itself in memory
+
+    if verified_tokens is not None:
+        token_data = verified_tokens.get(key)
+        if token_data is not None:  # verified before and not expired yet, callers must not modify it
+            return token_data
+
     try:  # try to decode the token and return it's data
+        verification_key = key_ring.verification_key(jwt.get_unverified_header(token).get('kid'))
+        if verification_key is None:  # signed with a key which was retired, or never ours
+            raise jwt.InvalidKeyError('Unknown kid')
+
+        verifying_key, algorithm = verification_key
         token_data = jwt.decode(
             jwt=token,
-            key=Config.JWT_SECRET,
-            algorithms=[Config.JWT_ALGORITHM]  # algorithm to decode the token
+            key=verifying_key,
+            algorithms=[algorithm]  # pinned per key, the alg of the header cannot pick another one
         )
 
+        if verified_tokens is not None and 'exp' in token_data:
+            ttl = token_data['exp'] - time.time()  # an entry never outlives the token
+            if ttl > 0:
+                verified_tokens.set(key, token_data, ttl)
+
         return token_data
 
     except jwt.PyJWTError as e:  # in case we failed to decode the token
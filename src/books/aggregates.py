@@ -0,0 +1,97 @@
+"""
+Recompute the rating aggregates of every book from its reviews.
+
+    python -m src.books.aggregates --batch-size 1000
+
+Run it once after the migration adding the columns, and whenever the aggregates are
+suspected to have drifted. Books are rewritten in batches of primary keys, each batch
+in its own short transaction, so the table is never locked as a whole.
+"""
+from sqlalchemy import Float, cast, func, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from src.db.models import Book, Review
+from src.config import Config
+import argparse
+import asyncio
+import logging
+
+
+def rating_aggregates_update(after_uid=None, last_uid=None):
+    """
+    UPDATE of the aggregates of the books with after_uid < uid <= last_uid (open ended when None),
+    computed from scratch with one grouped join whatever the number of reviews per book.
+    """
+    book = aliased(Book)
+    criteria = []
+    if after_uid is not None:
+        criteria.append(book.uid > after_uid)
+    if last_uid is not None:
+        criteria.append(book.uid <= last_uid)
+
+    totals = (
+        select(
+            book.uid.label('book_uid'),
+            func.count(Review.uid).label('review_count'),  # 0 for books without reviews, thanks to the outer join
+            func.coalesce(func.sum(Review.rating), 0).label('rating_sum'),
+            func.coalesce(cast(func.avg(Review.rating), Float), 0).label('rating_avg'),
+        )
+        .outerjoin(Review, Review.book_uid == book.uid)
+        .where(*criteria)
+        .group_by(book.uid)
+        .subquery('totals')
+    )
+
+    return (
+        update(Book)
+        .where(Book.uid == totals.c.book_uid)
+        .values(review_count=totals.c.review_count, rating_sum=totals.c.rating_sum, rating_avg=totals.c.rating_avg)
+    )
+
+
+async def recompute_rating_aggregates(session_maker: async_sessionmaker, batch_size: int = 1000) -> int:
+    """Rebuild the aggregates of every book, batch_size books per transaction, and return how many were updated"""
+    updated = 0
+    last_uid = None
+
+    async with session_maker() as session:
+        while True:
+            # the uid closing the batch, the statements hold a key range whatever the batch size
+            statement = select(Book.uid).order_by(Book.uid).offset(batch_size - 1).limit(1)
+            if last_uid is not None:
+                statement = statement.where(Book.uid > last_uid)
+
+            result = await session.exec(statement)
+            batch_last_uid = result.first()
+
+            result = await session.exec(
+                rating_aggregates_update(last_uid, batch_last_uid).execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+            updated += result.rowcount
+            logging.info(f'Recomputed the rating aggregates of {updated} books')
+
+            if batch_last_uid is None:  # that was the tail of the table
+                break
+
+            last_uid = batch_last_uid
+
+    return updated
+
+
+async def main():
+    from src.db.main import async_session
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=Config.BOOK_IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    updated = await recompute_rating_aggregates(async_session, args.batch_size)
+    print(f'Recomputed the rating aggregates of {updated} books')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+from typing import AsyncIterator, Iterable, List, Sequence, Tuple, Union
+import csv
+import io
+import json
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+CSV_MEDIA_TYPE = 'text/csv'
+DEFAULT_MAX_LINE_LENGTH = 65536  # bytes, far more than any book row needs
+IMPORT_FORMATS = {NDJSON_MEDIA_TYPE: 'ndjson', 'application/jsonl': 'ndjson', CSV_MEDIA_TYPE: 'csv'}
+EXPORT_MEDIA_TYPES = {'ndjson': NDJSON_MEDIA_TYPE, 'csv': CSV_MEDIA_TYPE}
+
+
+class UnreadableLine:
+    """Stands in for a line iter_lines could not hand over, with the reason to report"""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+LINE_TOO_LONG = UnreadableLine('Line too long')
+INVALID_UTF8 = UnreadableLine('Invalid UTF-8')
+
+
+def decode_line(line: bytes) -> Union[str, UnreadableLine]:
+    try:
+        return line.rstrip(b'\r').decode('utf-8')
+    except UnicodeDecodeError:
+        return INVALID_UTF8
+
+
+async def iter_lines(chunks: AsyncIterator[bytes],
+                     max_line_length: int = DEFAULT_MAX_LINE_LENGTH) -> AsyncIterator[Union[str, UnreadableLine]]:
+    """
+    Split a stream of utf-8 byte chunks into lines without holding more than one chunk in memory.
+    A line longer than max_line_length bytes is discarded as it arrives and yielded as
+    LINE_TOO_LONG, a line which is not valid utf-8 as INVALID_UTF8.
+    """
+    pending = b''  # split before decoding: a newline byte is never part of a multi-byte character
+    skipping = False  # in the middle of a line which is too long
+
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if skipping or len(line) > max_line_length:
+                skipping = False
+                yield LINE_TOO_LONG
+            else:
+                yield decode_line(line)
+
+        if len(pending) > max_line_length:  # a body without newlines must not grow in memory
+            skipping = True
+            pending = b''
+
+    if skipping or len(pending) > max_line_length:
+        yield LINE_TOO_LONG
+    elif pending:
+        yield decode_line(pending)
+
+
+async def iter_records(lines: AsyncIterator[Union[str, UnreadableLine]],
+                       import_format: str) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    """
+    Yield (line number, row) for every non blank line, or (line number, error message)
+    when a line cannot be parsed. CSV input needs a header line and one record per line.
+    """
+    header = None
+    line_number = 0
+
+    async for line in lines:
+        line_number += 1
+
+        if isinstance(line, UnreadableLine):  # dropped by iter_lines
+            yield line_number, line.error
+            continue
+
+        if not line.strip():
+            continue
+
+        if import_format == 'ndjson':
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Invalid JSON: {e}'
+                continue
+
+            if not isinstance(row, dict):
+                yield line_number, 'Expected a JSON object'
+                continue
+
+            yield line_number, row
+
+        else:
+            values = next(csv.reader([line]))
+
+            if header is None:  # the first line names the columns
+                header = [name.strip() for name in values]
+                continue
+
+            if len(values) != len(header):
+                yield line_number, f'Expected {len(header)} columns, got {len(values)}'
+                continue
+
+            yield line_number, dict(zip(header, values))
+
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value  # same date format the import accepts
+
+
+def encode_rows(rows: Iterable[Sequence], columns: List[str], export_format: str) -> bytes:
+    """Serialize one chunk of exported rows, dates and UUIDs are written as strings"""
+    rows = [[_export_value(value) for value in row] for row in rows]
+
+    if export_format == 'ndjson':
+        return ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows).encode('utf-8')
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+
+    return buffer.getvalue().encode('utf-8')
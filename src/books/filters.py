@@ -0,0 +1,51 @@
+from sqlmodel import select
+from src.db.models import Book, BookTag, Tag
+from .schemas import BookFilterModel
+from datetime import date, datetime
+
+SORT_COLUMNS = {'rating': Book.rating_avg}  # sort keys not named after their column
+
+# how the last sort value of a page is read back from its cursor
+SORT_VALUE_PARSERS = {
+    'created_at': datetime.fromisoformat,
+    'title': str,
+    'author': str,
+    'publisher': str,
+    'published_date': date.fromisoformat,
+    'page_count': int,
+    'rating': float,
+    'review_count': int,
+}
+
+
+def build_book_query(filters: BookFilterModel, *criteria):
+    """
+    Select (Book, sort value) for the books matching the filters and the extra criteria,
+    and return the statement with the column to sort on. The sort value of the last row
+    becomes the cursor of the next page.
+    """
+    sort_column = SORT_COLUMNS[filters.sort_by] if filters.sort_by in SORT_COLUMNS else getattr(Book, filters.sort_by)
+    statement = select(Book, sort_column).where(*criteria)
+
+    if filters.min_rating is not None:
+        statement = statement.where(Book.rating_avg >= filters.min_rating)
+
+    if filters.language is not None:
+        statement = statement.where(Book.language == filters.language)
+    if filters.author is not None:
+        statement = statement.where(Book.author == filters.author)
+    if filters.publisher is not None:
+        statement = statement.where(Book.publisher == filters.publisher)
+    if filters.published_from is not None:
+        statement = statement.where(Book.published_date >= filters.published_from)
+    if filters.published_to is not None:
+        statement = statement.where(Book.published_date <= filters.published_to)
+    if filters.min_pages is not None:
+        statement = statement.where(Book.page_count >= filters.min_pages)
+    if filters.max_pages is not None:
+        statement = statement.where(Book.page_count <= filters.max_pages)
+    if filters.tag is not None:
+        tagged = select(BookTag.book_id).join(Tag, Tag.uid == BookTag.tag_id).where(Tag.name == filters.tag)
+        statement = statement.where(Book.uid.in_(tagged))
+
+    return statement, sort_column
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
-from .schemas import Book, BookUpdateModel, BookCreateModel, BookDetailModel
+from .schemas import Book, BookUpdateModel, BookCreateModel, BookDetailModel, BookPage, BookImportResult, BookFilterModel
+from .bulk import IMPORT_FORMATS, EXPORT_MEDIA_TYPES, iter_lines, iter_records
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.books.service import BookService
-from src.db.main import get_session
-from typing import List
+from src.db.main import get_session, get_read_session, get_read_sessionmaker
+from fastapi.responses import StreamingResponse
+from src.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from src.config import Config
+from typing import Optional
 from src.auth.dependencies import AccessTokenBearer, RoleChecker
 from src.errors import BookNotFound
+from src.etag import etag_matches, not_modified
 
 book_router = APIRouter()
 book_service = BookService()
@@ -14,23 +19,69 @@ access_token_bearer = AccessTokenBearer()  # to requre authentication on each re
 role_checker = Depends(RoleChecker(['admin', 'user']))
 
 
-@book_router.get("/", response_model=List[Book], dependencies=[role_checker])
+@book_router.get("/", response_model=BookPage, dependencies=[role_checker])
 async def get_all_books(
-        session: AsyncSession = Depends(get_session),
+        request: Request,
+        response: Response,
+        filters: BookFilterModel = Depends(),  # every field is an optional query parameter
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,  # next_cursor of the previous page, only valid with the same filters
+        session: AsyncSession = Depends(get_read_session),
         token_details: dict = Depends(access_token_bearer)
 ):
-    books = await book_service.get_all_books(session)
+    etag = await book_service.get_books_etag(session, filters, limit, cursor)
+    if etag is not None:
+        if etag_matches(request, etag):  # nothing changed since the client's copy, skip loading the page
+            return not_modified(etag)
+        response.headers['ETag'] = etag
+
+    books = await book_service.get_all_books(session, limit=limit, cursor=cursor, filters=filters, etag=etag)
     return books
 
-@book_router.get("/user/{user_uid}", response_model=List[Book], dependencies=[role_checker])
+@book_router.get("/user/{user_uid}", response_model=BookPage, dependencies=[role_checker])
 async def get_user_book_submissions(  # to get the books submitted by the user
         user_uid: str,
-        session: AsyncSession = Depends(get_session),
+        request: Request,
+        response: Response,
+        filters: BookFilterModel = Depends(),  # every field is an optional query parameter
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session),
         token_details: dict = Depends(access_token_bearer)
 ):
-    books = await book_service.get_user_books(user_uid, session)
+    etag = await book_service.get_books_etag(session, filters, user_uid, limit, cursor)
+    if etag is not None:
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers['ETag'] = etag
+
+    books = await book_service.get_user_books(user_uid, session, limit=limit, cursor=cursor, filters=filters,
+                                               etag=etag)
     return books
 
+@book_router.get("/search", response_model=BookPage, dependencies=[role_checker])
+async def search_books(  # full text search, every word matches as a prefix
+        q: str = Query(min_length=1, max_length=200),
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session),
+        token_details: dict = Depends(access_token_bearer)
+):
+    books = await book_service.search_books(q, session, limit=limit, cursor=cursor)
+    return books
+
+
+@book_router.get("/export", dependencies=[role_checker])
+async def export_books(  # dump of the whole catalog, streamed as it is read
+        format: str = Query(default='ndjson', pattern='^(ndjson|csv)$'),
+        token_details: dict = Depends(access_token_bearer)
+):
+    return StreamingResponse(
+        book_service.export_books(get_read_sessionmaker(), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="books.{format}"'}
+    )
+
 @book_router.post("/",
                   status_code=status.HTTP_201_CREATED,
                   response_model=Book,
@@ -46,13 +97,44 @@ async def create_a_book(
     return new_book
 
 
+@book_router.post("/import", response_model=BookImportResult, dependencies=[role_checker])
+async def import_books(  # bulk load of a publisher feed sent as NDJSON or CSV
+        request: Request,
+        batch_size: int = Query(default=Config.BOOK_IMPORT_BATCH_SIZE, ge=1, le=10000),
+        session: AsyncSession = Depends(get_session),
+        token_details: dict = Depends(access_token_bearer)
+):
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    import_format = IMPORT_FORMATS.get(media_type)
+
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Send the books as one of: {', '.join(IMPORT_FORMATS)}"
+        )
+
+    lines = iter_lines(request.stream(), Config.BOOK_IMPORT_MAX_LINE_LENGTH)
+    records = iter_records(lines, import_format)  # the body is parsed as it arrives
+    user_id = token_details.get('user')['user_uid']
+
+    return await book_service.import_books(records, user_id, session, batch_size=batch_size)
+
+
 @book_router.get("/{book_uid}", response_model=BookDetailModel, dependencies=[role_checker])
 async def get_book(
         book_uid: str,
-        session: AsyncSession = Depends(get_session),
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_read_session),
         token_details: dict = Depends(access_token_bearer)
 ) -> dict:
-    book = await book_service.get_book(book_uid, session)
+    etag = await book_service.get_book_etag(book_uid, session)
+    if etag is not None:
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers['ETag'] = etag
+
+    book = await book_service.get_book_detail(book_uid, session, etag)
 
     if book:
         return book
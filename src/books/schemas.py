@@ -1,12 +1,14 @@
 import uuid
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional
 from datetime import date, datetime
 from src.reviews.schemas import ReviewModel
 from src.tags.schemas import TagModel
 
 
 class Book(BaseModel):
+    model_config = ConfigDict(from_attributes=True)  # allows building the schema straight from a Book row
+
     uid: uuid.UUID
     title: str
     author: str
@@ -18,9 +20,34 @@ class Book(BaseModel):
     updated_at: datetime
 
 class BookDetailModel(Book):  # book is returned with both -> tags and reviews
-    reviews: List[ReviewModel]
+    review_count: int
+    rating_sum: int
+    rating_avg: float  # 0 until the first review
+    reviews: List[ReviewModel]  # the most recent ones only, review_count has the total
     tags:List[TagModel]
 
+class BookPage(BaseModel):  # one page of books, newest first
+    items: List[Book]
+    next_cursor: Optional[str] = None  # pass it back as ?cursor= to get the next page, None on the last page
+
+class BookFilterModel(BaseModel):  # query parameters of the book listings, every filter is optional
+    language: Optional[str] = None
+    author: Optional[str] = None
+    publisher: Optional[str] = None
+    published_from: Optional[date] = None
+    published_to: Optional[date] = None
+    min_pages: Optional[int] = Field(default=None, ge=0)
+    max_pages: Optional[int] = Field(default=None, ge=0)
+    tag: Optional[str] = None  # tag name
+    min_rating: Optional[float] = Field(default=None, ge=0, le=5)  # average rating of the reviews
+    sort_by: Literal['created_at', 'title', 'author', 'publisher', 'published_date', 'page_count', 'rating',
+                     'review_count'] = 'created_at'
+    order: Literal['asc', 'desc'] = 'desc'
+
+    @property
+    def uses_rating(self) -> bool:
+        return self.min_rating is not None or self.sort_by in ('rating', 'review_count')
+
 class BookCreateModel(BaseModel):
     title: str
     author: str
@@ -36,3 +63,14 @@ class BookUpdateModel(BaseModel):
     publisher: str
     page_count: int
     language: str
+
+
+class BookImportError(BaseModel):  # a row of a bulk import which was skipped
+    line: int
+    error: str
+
+
+class BookImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BookImportError]  # the first errors only, failed has the full count
@@ -0,0 +1,66 @@
+from sqlalchemy import case, func, literal_column, or_, select, union
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from src.db.models import Book, BookTag, Tag
+from typing import Optional
+import re
+
+SEARCH_CONFIG = 'simple'  # must match the text search configuration used in the migration
+# inlined rather than bound, the planner only picks the tags expression index for a constant configuration
+search_config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+MAX_SEARCH_TERMS = 8
+
+# generated column maintained by postgres, not mapped on Book so it is never loaded with the books
+search_vector = literal_column('books.search_vector', type_=TSVECTOR)
+
+
+def build_prefix_tsquery(text: str, operator: str = '&') -> Optional[str]:
+    """
+    Turn free text into a tsquery where every word matches as a prefix, e.g. 'lord ring' -> 'lord:* & ring:*',
+    or 'lord:* | ring:*' with the '|' operator
+    """
+    terms = re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]  # drops tsquery operators the user may have typed
+
+    if not terms:
+        return None
+
+    return f' {operator} '.join(f'{term}:*' for term in terms)
+
+
+def ranked_matches(query, any_term_query):
+    """
+    Select of (book, rank) for the books matching query against their search document: the
+    book's vector followed by the names of its tags, so that the words of the query may
+    match across the book and its tags and a book found through its tags ranks by them.
+
+    A match has all its words in the book's vector or one of them in a tag name: the
+    candidates come from these two branches, each using its GIN index, and only they are
+    checked against their whole document.
+    """
+    by_book = select(Book.uid.label('uid')).where(search_vector.op('@@')(query))
+    by_tag = (
+        select(BookTag.book_id.label('uid'))
+        .join(Tag, Tag.uid == BookTag.tag_id)
+        .where(func.to_tsvector(search_config, Tag.name).op('@@')(any_term_query))
+    )
+    candidates = union(by_book, by_tag).subquery('candidates')
+
+    tag_names = (
+        select(BookTag.book_id.label('uid'), func.string_agg(Tag.name, ' ').label('names'))
+        .join(Tag, Tag.uid == BookTag.tag_id)
+        .group_by(BookTag.book_id)
+        .subquery('tag_names')
+    )
+    document = case(  # most books carry no tags, their document is their vector as is
+        (tag_names.c.names.is_(None), search_vector),
+        else_=search_vector.op('||')(func.to_tsvector(search_config, tag_names.c.names)),
+    )
+    rank = func.ts_rank(document, query)
+
+    statement = (
+        select(Book, rank)
+        .join(candidates, candidates.c.uid == Book.uid)
+        .outerjoin(tag_names, tag_names.c.uid == Book.uid)
+        .where(or_(search_vector.op('@@')(query), document.op('@@')(query)))  # the first spares most documents
+    )
+
+    return statement, rank
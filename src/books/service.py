@@ -1,38 +1,260 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
-from .schemas import BookCreateModel, BookUpdateModel
-from sqlmodel import select, desc
-from src.db.models import Book
-from datetime import datetime
+from .schemas import BookCreateModel, BookFilterModel, BookUpdateModel, BookPage, BookDetailModel, BookImportError, BookImportResult
+from sqlmodel import select, asc, desc
+from sqlalchemy import Float, tuple_, func, insert, update, delete, cast
+from sqlalchemy.dialects.postgresql import REAL
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.db.models import Book, BookTag, Review, Tag
+from src.db.pagination import DEFAULT_PAGE_SIZE, encode_cursor, decode_cursor, decode_keyset_cursor
+from src.errors import InvalidCursor
+from src.cache import CacheBackend, cache
+from src.etag import make_etag, bump_table_version, get_table_version
+from src.config import Config
+from .bulk import encode_rows
+from .filters import SORT_VALUE_PARSERS, build_book_query
+from .search import search_config, build_prefix_tsquery, ranked_matches
+from datetime import datetime, date
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import uuid
+
+BOOK_LIST_NAMESPACE = 'books:list'  # every cached page of books, dropped together on any book write
+RATED_BOOK_LIST_NAMESPACE = 'books:list:rated'  # pages filtered or sorted by rating, dropped on any review write
+TAGGED_BOOK_LIST_NAMESPACE = 'books:list:tagged'  # pages filtered by tag, dropped on any tag attach, rename or delete
+EXPORT_COLUMNS = ['uid', 'title', 'author', 'publisher', 'published_date', 'page_count', 'language', 'created_at',
+                  'updated_at']  # the fields of the Book schema
+MAX_REPORTED_IMPORT_ERRORS = 1000  # keeps the import response bounded when a whole feed is malformed
+
+
+def book_detail_key(book_uid) -> str:
+    return f'books:detail:{book_uid}'
 
 
 class BookService:  # this class performs our CRUD related to books
-    async def get_all_books(self, session: AsyncSession):
-        statement = select(Book).order_by(desc(Book.created_at))
+    def __init__(self, cache: CacheBackend = cache):
+        self.cache = cache
+
+    async def invalidate_book(self, book_uid, session: AsyncSession, listings: bool = True, ratings: bool = False,
+                              tags: bool = False) -> None:
+        await self.invalidate_books([book_uid], session, listings, ratings, tags)
+
+    async def invalidate_books(self, book_uids: List, session: AsyncSession, listings: bool = True,
+                               ratings: bool = False, tags: bool = False) -> None:
+        """
+        Drop the cached details of committed books and, when their listed columns changed, every
+        cached page. A change to their ratings only drops the pages filtered or sorted by rating,
+        a change to their tags the pages filtered by tag. Every listing ETag changes.
+        """
+        if book_uids:
+            await self.cache.delete(*[book_detail_key(book_uid) for book_uid in book_uids])
+
+        if listings:
+            await self.cache.bump_namespace(BOOK_LIST_NAMESPACE)
+        else:
+            if ratings:
+                await self.cache.bump_namespace(RATED_BOOK_LIST_NAMESPACE)
+            if tags:
+                await self.cache.bump_namespace(TAGGED_BOOK_LIST_NAMESPACE)
+
+        await bump_table_version('books', session)
+
+    async def _cached_page(self, key: str, criteria: list, filters: BookFilterModel, limit: int, cursor: Optional[str],
+                           session: AsyncSession, etag: Optional[str] = None) -> BookPage:
+        version = await self.cache.namespace(BOOK_LIST_NAMESPACE)
+        if filters.uses_rating:  # these pages also go stale with every review
+            version += ':' + await self.cache.namespace(RATED_BOOK_LIST_NAMESPACE)
+        if filters.tag is not None:  # and these with every tag change
+            version += ':' + await self.cache.namespace(TAGGED_BOOK_LIST_NAMESPACE)
+        if etag:  # the namespace of another worker's memory cache may lag, the ETag follows the database
+            version += ':' + etag
+        key = f'{BOOK_LIST_NAMESPACE}:{version}:{key}:{filters.model_dump_json(exclude_defaults=True)}:{limit}:{cursor}'
+
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return BookPage.model_validate_json(cached)
+
+        page = await self._paginate(criteria, filters, limit, cursor, session)
+
+        await self.cache.set(key, page.model_dump_json(), Config.CACHE_TTL)
+
+        return page
+
+    async def _paginate(self, criteria: list, filters: BookFilterModel, limit: int, cursor: Optional[str],
+                        session: AsyncSession) -> BookPage:
+        """Filter, sort and keyset-paginate the books on (sort column, uid)"""
+        statement, sort_column = build_book_query(filters, *criteria)
+        descending = filters.order == 'desc'
+        after = decode_keyset_cursor(cursor, SORT_VALUE_PARSERS[filters.sort_by])
+
+        if after is not None:  # only rows past the last row of the previous page
+            key, last = tuple_(sort_column, Book.uid), tuple_(*after)
+            statement = statement.where(key < last if descending else key > last)
+
+        direction = desc if descending else asc
+        statement = statement.order_by(direction(sort_column), direction(Book.uid)).limit(limit + 1)  # one extra row tells us if there is a next page
 
         result = await session.exec(statement)
 
-        return result.all()
+        rows = result.all()
 
-    async def get_user_books(self, user_uid: str,  session: AsyncSession):
-        statement = (
-            select(Book)
-            .where(Book.user_uid == user_uid)
-            .order_by(desc(Book.created_at))
-        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_book, last_value = rows[-1]
+            next_cursor = encode_cursor(last_value, last_book.uid)
+
+        return BookPage(items=[book for book, _ in rows], next_cursor=next_cursor)
+
+    async def get_all_books(self, session: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                            filters: BookFilterModel = BookFilterModel(), etag: Optional[str] = None):
+        return await self._cached_page('all', [], filters, limit, cursor, session, etag)
+
+    async def get_user_books(self, user_uid: str, session: AsyncSession, limit: int = DEFAULT_PAGE_SIZE,
+                             cursor: Optional[str] = None, filters: BookFilterModel = BookFilterModel(),
+                             etag: Optional[str] = None):
+        criteria = [Book.user_uid == user_uid]
+
+        return await self._cached_page(f'user:{user_uid}', criteria, filters, limit, cursor, session, etag)
+
+    async def search_books(self, text: str, session: AsyncSession, limit: int = DEFAULT_PAGE_SIZE,
+                           cursor: Optional[str] = None) -> BookPage:
+        """Full text search over title, author, publisher and tag names, best matches first"""
+        tsquery = build_prefix_tsquery(text)
+
+        if tsquery is None:  # nothing searchable in the text
+            return BookPage(items=[])
+
+        query = func.to_tsquery(search_config, tsquery)
+        any_term_query = func.to_tsquery(search_config, build_prefix_tsquery(text, '|'))
+        statement, rank = ranked_matches(query, any_term_query)
+
+        if cursor is not None:  # continue below the (rank, uid) of the last row of the previous page
+            last_rank, last_uid = decode_cursor(cursor, 2)
+            try:
+                after = (cast(float(last_rank), REAL), uuid.UUID(last_uid))
+            except (TypeError, ValueError):
+                raise InvalidCursor()
+            statement = statement.where(tuple_(rank, Book.uid) < tuple_(*after))
+
+        statement = statement.order_by(desc(rank), desc(Book.uid)).limit(limit + 1)
 
         result = await session.exec(statement)
 
-        return result.all()
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_book, last_rank = rows[-1]
+            next_cursor = encode_cursor(last_rank, last_book.uid)
+
+        return BookPage(items=[book for book, _ in rows], next_cursor=next_cursor)
+
+    async def get_books_etag(self, session: AsyncSession, filters: BookFilterModel, *key_parts) -> Optional[str]:
+        """
+        ETag of a page of books, it changes with every committed write to the books, their
+        ratings or their tags. None without a version to build it from.
+        """
+        version = await get_table_version('books', session)
+
+        if version is None:
+            return None
+
+        return make_etag('books', version, filters.model_dump_json(exclude_defaults=True), *key_parts)
+
+    async def get_book_etag(self, book_uid: str, session: AsyncSession) -> Optional[str]:
+        """ETag of a book detail from one aggregate query, None if the book does not exist"""
+        statement = select(
+            Book.updated_at,
+            select(func.count()).where(Review.book_uid == Book.uid).scalar_subquery(),
+            select(func.max(Review.updated_at)).where(Review.book_uid == Book.uid).scalar_subquery(),
+            select(func.count()).select_from(BookTag).where(BookTag.book_id == Book.uid).scalar_subquery(),
+            select(func.max(Tag.updated_at))  # tag renames
+            .join(BookTag, BookTag.tag_id == Tag.uid).where(BookTag.book_id == Book.uid).scalar_subquery()
+        ).where(Book.uid == book_uid)
+
+        result = await session.exec(statement)
+
+        row = result.first()
+
+        return make_etag('book', book_uid, *row) if row is not None else None
+
+    async def apply_review_change(self, book_uid, session: AsyncSession, count_delta: int, rating_delta: int) -> None:
+        """
+        Move the rating aggregates of a book by the given deltas, in the caller's transaction.
+        Adding a review is (1, rating), deleting one (-1, -rating) and editing one (0, new - old).
+        """
+        review_count = Book.review_count + count_delta  # computed by the database, concurrent reviews are not lost
+        rating_sum = Book.rating_sum + rating_delta
+
+        statement = (
+            update(Book)
+            .where(Book.uid == book_uid)
+            .values(
+                review_count=review_count,
+                rating_sum=rating_sum,
+                rating_avg=func.coalesce(cast(rating_sum, Float) / func.nullif(review_count, 0), 0)
+            )
+        )
 
-    async def get_book(self, book_uid: str, session: AsyncSession):
+        await session.exec(statement)
+
+    async def get_book(self, book_uid: str, session: AsyncSession, load_relationships: bool = True):
         statement = select(Book).where(Book.uid == book_uid)
 
+        if load_relationships:  # a popular book has far too many reviews, writes leave them unloaded
+            statement = statement.options(selectinload(Book.reviews), selectinload(Book.tags))
+
         result = await session.exec(statement)
 
         book = result.first()
 
         return book if book is not None else None
 
+    async def get_book_detail(self, book_uid: str, session: AsyncSession,
+                              etag: Optional[str] = None) -> Optional[BookDetailModel]:
+        """
+        Book with its tags and most recent reviews, served from the cache when possible.
+        The entry records the ETag it was built for and is only served under that ETag, so the
+        body always matches the ETag it is sent with even when another worker's write has not
+        reached this cache; invalidate_book drops it as soon as this worker sees the write.
+        """
+        key = book_detail_key(book_uid)
+
+        cached = await self.cache.get(key)
+        if cached is not None:
+            cached_etag, _, body = cached.partition('\n')
+            if etag is None or cached_etag == etag:
+                return BookDetailModel.model_validate_json(body)
+
+        statement = select(Book).where(Book.uid == book_uid).options(selectinload(Book.tags))
+
+        result = await session.exec(statement)
+
+        book = result.first()
+
+        if book is None:
+            return None
+
+        statement = (  # a bounded preview, a book may have far too many reviews to embed them all
+            select(Review)
+            .where(Review.book_uid == book.uid)
+            .order_by(desc(Review.created_at), desc(Review.uid))
+            .limit(Config.BOOK_DETAIL_REVIEWS)
+        )
+
+        result = await session.exec(statement)
+
+        book_detail = BookDetailModel.model_validate(
+            {**book.model_dump(), 'tags': book.tags, 'reviews': result.all()}, from_attributes=True
+        )
+
+        await self.cache.set(key, f"{etag or ''}\n{book_detail.model_dump_json()}", Config.CACHE_TTL)
+
+        return book_detail
+
     async def create_book(self, book_data: BookCreateModel, user_uid: str, session: AsyncSession):
         book_data_dict = book_data.model_dump()
 
@@ -48,12 +270,112 @@ class BookService:  # this class performs our CRUD related to books
 
         await session.commit()
 
+        await self.invalidate_books([], session)  # the new book belongs on the first pages
+
         return new_book
 
+    async def import_books(self, records: AsyncIterator[Tuple[int, Union[dict, str]]], user_uid: str,
+                           session: AsyncSession, batch_size: int = Config.BOOK_IMPORT_BATCH_SIZE) -> BookImportResult:
+        """
+        Insert a stream of (line number, row) records in multi-row INSERTs of batch_size rows.
+        Invalid rows are reported and skipped, the rest of the load goes on.
+        """
+        user_uid = uuid.UUID(str(user_uid))
+        inserted = 0
+        errors = []
+        failed = 0
+        batch = []
+
+        def reject(line: int, error: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                errors.append(BookImportError(line=line, error=error))
+
+        async def flush():
+            nonlocal inserted
+            rejected = await self._insert_books(batch, session)
+            for line, error in rejected:
+                reject(line, error)
+            if len(rejected) < len(batch):  # every batch is committed on its own, so is its version
+                await self.invalidate_books([], session)
+            inserted += len(batch) - len(rejected)
+            batch.clear()
+
+        async for line, record in records:
+            if isinstance(record, str):  # the line could not even be parsed
+                reject(line, record)
+                continue
+
+            try:
+                book_data = BookCreateModel.model_validate(record)
+                row = book_data.model_dump()
+                row['published_date'] = date.fromisoformat(row['published_date'])  # much cheaper than strptime
+            except ValidationError as e:
+                reject(line, '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            except ValueError as e:
+                reject(line, f'published_date: {e}')
+                continue
+
+            row['uid'] = uuid.uuid4()
+            row['user_uid'] = user_uid
+            batch.append((line, row))
+
+            if len(batch) >= batch_size:
+                await flush()
+
+        if batch:
+            await flush()
+
+        return BookImportResult(inserted=inserted, failed=failed, errors=errors)
+
+    async def export_books(self, session_maker: async_sessionmaker, export_format: str,
+                           chunk_size: int = Config.BOOK_EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Stream the whole catalog through a server side cursor, chunk_size rows at a time.
+        The export outlives the request dependencies, so it opens its own session.
+        """
+        if export_format == 'csv':
+            yield encode_rows([EXPORT_COLUMNS], EXPORT_COLUMNS, export_format)  # header line
+
+        columns = [Book.__table__.c[name] for name in EXPORT_COLUMNS]  # plain rows, nothing kept in the identity map
+        statement = (
+            select(*columns)
+            .order_by(Book.created_at, Book.uid)
+            .execution_options(yield_per=chunk_size)
+        )
+
+        async with session_maker() as session:
+            result = await session.stream(statement)
+
+            async for rows in result.partitions():
+                yield encode_rows(rows, EXPORT_COLUMNS, export_format)
+
+    async def _insert_books(self, batch: List[Tuple[int, dict]], session: AsyncSession) -> List[Tuple[int, str]]:
+        """Insert a batch in one statement, falling back to row by row to single out the rows the database rejects"""
+        try:
+            await session.exec(insert(Book), params=[row for _, row in batch])
+            await session.commit()
+            return []
+        except SQLAlchemyError:
+            await session.rollback()
+
+        rejected = []
+        for line, row in batch:
+            try:
+                await session.exec(insert(Book), params=[row])
+                await session.commit()
+            except SQLAlchemyError as e:
+                await session.rollback()
+                rejected.append((line, str(getattr(e, 'orig', e))))
+
+        return rejected
+
     async def update_book(
         self, book_uid: str, update_data: BookUpdateModel, session: AsyncSession
     ):
-        book_to_update = await self.get_book(book_uid,session)
+        book_to_update = await self.get_book(book_uid, session, load_relationships=False)
 
         if book_to_update is not None:
             update_data_dict = update_data.model_dump()
@@ -63,19 +385,27 @@ class BookService:  # this class performs our CRUD related to books
 
             await session.commit()
 
+            await self.invalidate_book(book_to_update.uid, session)
+
             return book_to_update
         else:
             return None
 
     async def delete_book(self,book_uid:str, session:AsyncSession):
 
-        book_to_delete = await self.get_book(book_uid,session)
+        book_to_delete = await self.get_book(book_uid, session, load_relationships=False)
 
         if book_to_delete is not None:
-            await session.delete(book_to_delete)
+            # what the ORM did to the loaded relationships, without loading them: the reviews lose their book
+            # and the tag links go with it
+            await session.exec(update(Review).where(Review.book_uid == book_to_delete.uid).values(book_uid=None))
+            await session.exec(delete(BookTag).where(BookTag.book_id == book_to_delete.uid))
+            await session.exec(delete(Book).where(Book.uid == book_to_delete.uid))
 
             await session.commit()
 
+            await self.invalidate_book(book_to_delete.uid, session)
+
             return {}
 
         else:
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from typing import Any, Optional
+from src.config import Config
+import logging
+import time
+import uuid
+
+
+class LRUTTLCache:
+    """Bounded mapping which drops the least recently used entry when full and entries past their expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():  # expired entries are removed on access
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)  # mark as most recently used
+
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # evict the least recently used entry
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheBackend:
+    """Interface of the response cache, values are serialized strings"""
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError("Please Override this method in child classes")
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        raise NotImplementedError("Please Override this method in child classes")
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError("Please Override this method in child classes")
+
+    async def namespace(self, name: str) -> str:
+        """
+        Current version token of a group of keys, embed it in the keys so that
+        bump_namespace invalidates the whole group at once.
+        """
+        key = f'{name}:version'
+
+        version = await self.get(key)
+        if version is None:
+            version = uuid.uuid4().hex  # random, so a lost version never brings old entries back to life
+            await self.set(key, version)
+
+        return version
+
+    async def bump_namespace(self, name: str) -> None:
+        await self.set(f'{name}:version', uuid.uuid4().hex)
+
+
+class NullCache(CacheBackend):
+    """Caches nothing, every read goes to the database"""
+
+    async def get(self, key: str) -> Optional[str]:
+        return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        pass
+
+    async def delete(self, *keys: str) -> None:
+        pass
+
+
+class InMemoryCache(CacheBackend):
+    """Per process cache, invalidations are not seen by other uvicorn workers until the TTL runs out"""
+
+    def __init__(self, max_entries: int = 10000):
+        self._cache = LRUTTLCache(max_entries)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self._cache.set(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._cache.delete(key)
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by all workers, works with any client speaking the redis protocol"""
+
+    def __init__(self, client, prefix: str = 'bookly:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await self.client.get(self.prefix + key)
+        except Exception as e:  # an unavailable cache must not fail the request, fall back to the database
+            logging.exception(e)
+            return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        try:
+            await self.client.set(self.prefix + key, value, ex=ttl)
+        except Exception as e:
+            logging.exception(e)
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            await self.client.delete(*[self.prefix + key for key in keys])
+        except Exception as e:
+            logging.exception(e)
+
+
+def create_cache() -> CacheBackend:
+    if Config.CACHE_BACKEND == 'redis':
+        from src.db.redis import redis_client
+        return RedisCache(redis_client)
+
+    if Config.CACHE_BACKEND == 'memory':
+        return InMemoryCache(Config.CACHE_MAX_ENTRIES)
+
+    return NullCache()
+
+
+cache = create_cache()
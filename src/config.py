@@ -4,8 +4,12 @@ from typing import ClassVar
 
 class Settings(BaseSettings):  # inherit from .env file
     DATABASE_URL: str
+    DATABASE_READ_URL: str = ''  # comma separated read replica URLs, reads go to DATABASE_URL when empty
     JWT_SECRET: str
     JWT_ALGORITHM: str
+    JWT_SIGNING_KEY: str = ''  # PEM private key file (RSA or Ed25519) signing the tokens, JWT_SECRET and JWT_ALGORITHM when empty
+    JWT_VERIFICATION_KEYS: str = ''  # comma separated PEM files of retired signing keys whose tokens are still accepted
+    JWT_ACCEPT_SECRET_SIGNED: bool = False  # with JWT_SIGNING_KEY, also accept tokens signed with JWT_SECRET (no kid), only while switching
     SENDGRID_API_KEY: str
     MAIL_FROM: str
     MAIL_FROM_NAME: str
@@ -13,6 +17,50 @@ class Settings(BaseSettings):  # inherit from .env file
     AZURE_SERVICE_BUS_CONNECTION_STRING: str
     AZURE_SERVICE_BUS_QUEUE_NAME: str
     WEBHOOK_URL: str
+    DB_POOL_SIZE: int = 5  # connections kept open per worker process
+    DB_MAX_OVERFLOW: int = 10  # extra connections opened under load on top of DB_POOL_SIZE
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection before failing the request
+    DB_POOL_RECYCLE: int = 1800  # seconds after which a connection is replaced, must be below the server idle timeout
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout so a dropped one is replaced instead of failing
+    REDIS_URL: str = 'redis://localhost:6379/0'
+    CACHE_BACKEND: str = 'memory'  # 'memory' (per worker), 'redis' (shared by all workers) or 'none'
+    CACHE_TTL: int = 60  # seconds a cached response may be served before it is rebuilt
+    CACHE_MAX_ENTRIES: int = 10000  # least recently used entries are dropped past this size (memory backend)
+    BLOCKLIST_BACKEND: str = 'memory'  # revoked tokens kept in 'memory' (per worker) or 'redis' (shared by all workers)
+    BLOCKLIST_MAX_ENTRIES: int = 100000  # memory backend only, past this size the revocations closest to expiry are dropped
+    BLOCKLIST_FILTER_SYNC_INTERVAL: float = 5  # redis backend only, seconds between rebuilds of the local bloom filter, 0 disables it
+    BLOCKLIST_FILTER_ERROR_RATE: float = 0.01  # share of the checks of valid tokens which still go to redis
+    OUTBOX_BATCH_SIZE: int = 100  # outbox rows sent (and deleted) per transaction of the relay
+    OUTBOX_POLL_INTERVAL: float = 1.0  # seconds between outbox checks when no review of this worker woke the relay up
+    NOTIFY_BATCH_MAX_COUNT: int = 100  # messages per Service Bus batch
+    NOTIFY_BATCH_MAX_BYTES: int = 0  # bytes per Service Bus batch, 0 for the largest message the queue accepts
+    NOTIFY_BATCH_LINGER: float = 0.01  # seconds a batch waits for more messages before it is sent
+    NOTIFY_BATCH_MAX_PENDING: int = 1000  # queued messages per worker before publishers have to wait
+    NOTIFY_CONSUMER_CONCURRENCY: int = 8  # notifications handled (webhooks called) at once per worker
+    NOTIFY_CONSUMER_PREFETCH: int = 0  # messages the receiver buffers ahead, each one's lock already runs while it waits
+    NOTIFY_CONSUMER_LOCK_RENEWAL: float = 20  # seconds between lock renewals of a message being handled, 0 disables
+    NOTIFY_CONSUMER_ORDERED: bool = False  # handle the notifications of one book one at a time, in the order received
+    WEBHOOK_MAX_CONNECTIONS: int = 8  # open connections to the webhook per worker, calls past it wait for one
+    WEBHOOK_KEEPALIVE_EXPIRY: float = 30  # seconds an idle connection to the webhook is kept open
+    WEBHOOK_TIMEOUT: float = 10  # seconds to wait for the webhook to take the request and answer
+    WEBHOOK_CONNECT_TIMEOUT: float = 5  # seconds to connect to the webhook
+    WEBHOOK_HTTP2: bool = True  # multiplexes the calls on one connection when the h2 package is installed
+    BOOK_IMPORT_BATCH_SIZE: int = 1000  # rows per multi-row INSERT (and per transaction) of a bulk import
+    BOOK_IMPORT_MAX_LINE_LENGTH: int = 65536  # bytes of one import line, longer lines are reported and skipped
+    BOOK_EXPORT_CHUNK_SIZE: int = 1000  # rows fetched from the server side cursor and written per chunk of an export
+    BOOK_DETAIL_REVIEWS: int = 5  # most recent reviews embedded in a book detail, the rest is paged from /reviews/book/{uid}
+    AUTHORIZATION_MODE: str = 'claims'  # 'claims' trusts role and is_verified from the access token, 'database' looks the user up
+    USER_CACHE_TTL: int = 30  # seconds a looked up role and verification status is reused, 0 disables the cache
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_MAX_ENTRIES: int = 10000  # recently verified tokens kept until their exp, skipping the signature check, 0 disables
+    PASSWORD_HASH_SCHEME: str = 'bcrypt'  # 'bcrypt' or 'argon2' (argon2id), hashes of the other one are upgraded on login
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # log2 of the bcrypt iterations, +1 doubles the cost
+    PASSWORD_ARGON2_TIME_COST: int = 2  # argon2id passes over the memory
+    PASSWORD_ARGON2_MEMORY_COST: int = 19456  # argon2id memory in KiB
+    PASSWORD_ARGON2_PARALLELISM: int = 1  # argon2id lanes, keep it at 1 when hashing on a pool of workers
+    PASSWORD_HASH_EXECUTOR: str = 'thread'  # 'thread', 'process' or 'inline' (blocks the event loop, benchmarks only)
+    PASSWORD_HASH_WORKERS: int = 0  # hashes computed at once per worker process, 0 for the number of CPUs
+    PASSWORD_HASH_MAX_QUEUE: int = 100  # hashes waiting for a free worker before new ones get a 503, 0 for no limit
     model_config = SettingsConfigDict(  # to read our .env file
         env_file='.env',
         extra='ignore'  # ignore any extra attributes
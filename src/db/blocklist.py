@@ -1,23 +1,242 @@
+from typing import Dict, List, Optional
+from src.config import Config
+from src.db.bloom import BloomFilter
+import asyncio
+import heapq
+import logging
+import math
 import time
+import os
 
-JTI_EXPIRY = 3600
-token_blocklist = {}  # dict to store invalided JTIs
 
+class TokenBlocklist:
+    """Interface of the revoked token store, a JWT ID (JTI) is kept until the token it belongs to expires"""
 
-async def add_jti_to_blocklist(jti: str) -> None:
+    async def add(self, jti: str, expires_at: float) -> None:
+        """Revoke a token, expires_at is the epoch time of its exp claim"""
+        raise NotImplementedError("Please Override this method in child classes")
+
+    async def contains(self, jti: str) -> bool:
+        raise NotImplementedError("Please Override this method in child classes")
+
+    async def revoked(self) -> List[str]:
+        """JTIs of every revoked token which has not expired yet"""
+        raise NotImplementedError("Please Override this method in child classes")
+
+    def snapshot(self) -> dict:
+        return {'pid': os.getpid(), 'backend': type(self).__name__}
+
+
+class InMemoryBlocklist(TokenBlocklist):
+    """
+    Per process blocklist, a logout is not seen by other uvicorn workers. Expired entries
+    are swept on every add, and past max_entries the entries closest to expiry are dropped.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._expiries: Dict[str, float] = {}  # jti -> expires_at
+        self._heap = []  # (expires_at, jti), soonest expiry first
+
+    async def add(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        self.sweep(now)
+
+        if expires_at <= now:  # nothing to revoke, the token is rejected as expired anyway
+            return
+
+        self._expiries[jti] = expires_at
+        heapq.heappush(self._heap, (expires_at, jti))
+
+        while len(self._expiries) > self.max_entries:
+            logging.warning('Token blocklist is full, a revoked token is valid again until it expires')
+            self._pop()
+
+    async def contains(self, jti: str) -> bool:
+        expires_at = self._expiries.get(jti)
+
+        return expires_at is not None and expires_at > time.time()
+
+    async def revoked(self) -> List[str]:
+        self.sweep()
+        return list(self._expiries)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), 'entries': len(self), 'max_entries': self.max_entries}
+
+    def sweep(self, now: float = None) -> None:
+        """Drop the expired entries, costs O(log n) per dropped entry and nothing when none expired"""
+        now = time.time() if now is None else now
+
+        while self._heap and self._heap[0][0] <= now:
+            self._pop()
+
+    def _pop(self) -> None:
+        expires_at, jti = heapq.heappop(self._heap)
+        if self._expiries.get(jti) == expires_at:  # a re-added jti leaves its older heap entry behind
+            del self._expiries[jti]
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+
+class RedisBlocklist(TokenBlocklist):
+    """Blocklist shared by all workers, redis drops every entry by itself when its token expires"""
+
+    def __init__(self, client, prefix: str = 'bookly:blocklist:'):
+        self.client = client
+        self.prefix = prefix
+
+    @property
+    def index_key(self) -> str:  # sorted set of the revoked JTIs scored by expiry, read to build the pre-filter
+        return self.prefix + 'index'
+
+    async def add(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        ttl = math.ceil(expires_at - now)  # whole seconds, rounded up so the entry never expires first
+
+        if ttl > 0:
+            await self.client.set(self.prefix + jti, '1', ex=ttl)
+            await self.client.zadd(self.index_key, {jti: expires_at})
+            await self.client.zremrangebyscore(self.index_key, '-inf', now)  # the index has no TTL of its own
+
+    async def contains(self, jti: str) -> bool:
+        # errors are not swallowed as in the response cache, a revocation which cannot be checked fails the request
+        return await self.client.get(self.prefix + jti) is not None
+
+    async def revoked(self) -> List[str]:
+        return await self.client.zrangebyscore(self.index_key, time.time(), '+inf')
+
+
+class FilteredBlocklist(TokenBlocklist):
+    """
+    Answers most checks without asking the (remote) backend: a bloom filter of the revoked
+    JTIs, rebuilt from the backend every `sync_interval` seconds in the background, rules out
+    the tokens which were certainly not revoked. Revocations of this worker enter the filter
+    at once, those of other workers within one sync_interval. A filter not synced for two
+    intervals is not trusted and every check goes to the backend until a sync succeeds.
+    """
+
+    def __init__(self, backend: TokenBlocklist, sync_interval: float = 5, error_rate: float = 0.01,
+                 min_capacity: int = 1024):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self._filter: Optional[BloomFilter] = None
+        self._synced_at: Optional[float] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._added_during_sync: Optional[List[str]] = None  # a list while a sync is reading the backend
+        self.reset()
+
+    def reset(self) -> None:
+        self.checks = 0
+        self.lookups_avoided = 0  # definite negatives of the filter
+        self.remote_lookups = 0
+        self.false_positives = 0  # the filter said maybe, the backend said not revoked
+        self.syncs = 0
+        self.sync_failures = 0
+
+    async def add(self, jti: str, expires_at: float) -> None:
+        await self.backend.add(jti, expires_at)
+
+        if self._filter is not None:
+            self._filter.add(jti)
+        if self._added_during_sync is not None:  # the sync may have read the backend before this revocation
+            self._added_during_sync.append(jti)
+
+    async def contains(self, jti: str) -> bool:
+        self.checks += 1
+        self._schedule_sync()
+
+        if self._filter_is_fresh() and jti not in self._filter:
+            self.lookups_avoided += 1
+            return False
+
+        self.remote_lookups += 1
+        revoked = await self.backend.contains(jti)
+
+        if not revoked and self._filter_is_fresh():
+            self.false_positives += 1
+
+        return revoked
+
+    async def revoked(self) -> List[str]:
+        return await self.backend.revoked()
+
+    def _filter_is_fresh(self) -> bool:
+        return self._synced_at is not None and time.monotonic() - self._synced_at < 2 * self.sync_interval
+
+    def _schedule_sync(self) -> None:
+        if self._sync_task is not None:
+            return
+
+        if self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval:
+            self._sync_task = asyncio.create_task(self.sync())
+
+    async def sync(self) -> None:
+        """Rebuild the filter from the backend, which also drops the expired revocations"""
+        self._added_during_sync = []
+        started = time.monotonic()
+
+        try:
+            revoked = await self.backend.revoked() + self._added_during_sync
+        except Exception as e:  # keep the old filter, it is trusted until it gets too old
+            logging.exception(e)
+            self.sync_failures += 1
+            return
+        finally:
+            self._sync_task = None
+            self._added_during_sync = None
+
+        self._filter = BloomFilter.from_items(revoked, max(self.min_capacity, 2 * len(revoked)), self.error_rate)
+        self._synced_at = started
+        self.syncs += 1
+
+    def snapshot(self) -> dict:
+        negatives = self.lookups_avoided + self.false_positives  # checks of tokens which were not revoked
+        return {
+            **super().snapshot(),
+            'store': type(self.backend).__name__,
+            'checks': self.checks,
+            'lookups_avoided': self.lookups_avoided,
+            'remote_lookups': self.remote_lookups,
+            'false_positives': self.false_positives,
+            'false_positive_rate': round(self.false_positives / negatives, 6) if negatives else 0.0,
+            'target_false_positive_rate': self.error_rate,
+            'filter_entries': self._filter.count if self._filter is not None else 0,
+            'filter_capacity': self._filter.capacity if self._filter is not None else 0,
+            'syncs': self.syncs,
+            'sync_failures': self.sync_failures,
+            'seconds_since_sync': round(time.monotonic() - self._synced_at, 3) if self._synced_at else None,
+        }
+
+
+def create_blocklist() -> TokenBlocklist:
+    if Config.BLOCKLIST_BACKEND == 'redis':
+        from src.db.redis import redis_client
+        blocklist = RedisBlocklist(redis_client)
+
+        if Config.BLOCKLIST_FILTER_SYNC_INTERVAL > 0:  # no network hop for the tokens which were never revoked
+            return FilteredBlocklist(blocklist, Config.BLOCKLIST_FILTER_SYNC_INTERVAL, Config.BLOCKLIST_FILTER_ERROR_RATE)
+
+        return blocklist
+
+    return InMemoryBlocklist(Config.BLOCKLIST_MAX_ENTRIES)
+
+
+token_blocklist = create_blocklist()
+
+
+async def add_jti_to_blocklist(jti: str, expires_at: float) -> None:
     """
-    Add a JWT ID (JTI) to the blocklist with an expiry time.
+    Add a JWT ID (JTI) to the blocklist until the token expires.
     """
-    expiry_time = time.time() + JTI_EXPIRY
-    token_blocklist[jti] = expiry_time  # key is the JTI, value is the calculated expiry_time
+    await token_blocklist.add(jti, expires_at)
 
 
 async def token_in_blocklist(jti: str) -> bool:
     """
     Check if a JWT ID (JTI) is in the blocklist and has not expired.
     """
-    expiry_time = token_blocklist.get(jti)  # if JTI is not found in the dictionary returns None
-    if expiry_time is None or expiry_time < time.time():  # checks if the token is not found (in the blocklist) or expired
-        token_blocklist.pop(jti, None)  # Cleanup expired tokens
-        return False  # If the JTI is not found or is expired (meaning the token is considered valid)
-    return True  # This indicates the token is still invalid and should not be used
+    return await token_blocklist.contains(jti)
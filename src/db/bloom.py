@@ -0,0 +1,39 @@
+from typing import Iterable
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and about `error_rate` false positives
+    while it holds at most `capacity` items. Items cannot be removed, rebuild it instead.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))  # bits
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], capacity: int, error_rate: float = 0.01) -> 'BloomFilter':
+        bloom = cls(capacity, error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        # double hashing, k positions out of one digest
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
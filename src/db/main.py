@@ -3,22 +3,97 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.config import Config
 from sqlalchemy.ext.asyncio import async_sessionmaker
+from fastapi import Depends, Request
+from typing import Dict
+from .pool import InstrumentedQueuePool
+import itertools
 
-engine = create_async_engine(url = Config.DATABASE_URL)
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
-async def init_db():  # this makes the connection to db
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)  # conn is our connection object. we want to access the metadata object on top of this SQLModel
 
+def create_engine(url: str):
+    return create_async_engine(
+        url = url,
+        poolclass = InstrumentedQueuePool,  # times every checkout so the pool can be sized from real numbers
+        pool_size = Config.DB_POOL_SIZE,
+        max_overflow = Config.DB_MAX_OVERFLOW,
+        pool_timeout = Config.DB_POOL_TIMEOUT,
+        pool_recycle = Config.DB_POOL_RECYCLE,
+        pool_pre_ping = Config.DB_POOL_PRE_PING
+    )
 
-#function to return our session
-async def get_session()->AsyncSession:
 
-    async_session = async_sessionmaker(  # we have to bond it with our AsyncEngine to carry out our CRUD
-        bind = engine,
+def create_sessionmaker(bind):
+    return async_sessionmaker(  # we have to bond it with our AsyncEngine to carry out our CRUD
+        bind = bind,
         class_ = AsyncSession,
         expire_on_commit=False  # every session can be used after commiting
     )
 
+
+engine = create_engine(Config.DATABASE_URL)
+async_session = create_sessionmaker(engine)
+
+read_engines = [create_engine(url.strip()) for url in Config.DATABASE_READ_URL.split(',') if url.strip()]
+read_sessions = [create_sessionmaker(read_engine) for read_engine in read_engines]
+_next_read_session = itertools.cycle(read_sessions or [async_session])  # round robin over the replicas
+_writing_routes: Dict[int, bool] = {}
+
+
+async def init_db():  # this makes the connection to db
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)  # conn is our connection object. we want to access the metadata object on top of this SQLModel
+
+
+def get_read_sessionmaker() -> async_sessionmaker:
+    """Next replica session factory in round robin order, or the primary one without replicas"""
+    return next(_next_read_session)
+
+
+#function to return our session
+async def get_session(request: Request)->AsyncSession:
+    request.state.use_primary = True  # the rest of this request has to read its own writes
+
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def _route_writes(route) -> bool:
+    """True if the route or any of its dependencies asks for get_session, worked out once per route"""
+    def writes(dependant) -> bool:
+        return any(dependency.call is get_session or writes(dependency) for dependency in dependant.dependencies)
+
+    if id(route) not in _writing_routes:  # routes are not hashable, they live as long as the app
+        _writing_routes[id(route)] = writes(route.dependant)
+
+    return _writing_routes[id(route)]
+
+
+def use_primary(request: Request) -> bool:
+    """
+    Whether the reads of this request go to the primary: it is not read-only, or it writes.
+    The route is looked at as a whole, a read session resolved before the write session of
+    the same request must not be served by a replica either.
+    """
+    if request.method not in READ_ONLY_METHODS or getattr(request.state, 'use_primary', False):
+        return True
+
+    route = request.scope.get('route')
+
+    return route is not None and _route_writes(route)
+
+
+async def get_read_session(request: Request, primary: bool = Depends(use_primary)) -> AsyncSession:
+    """Session for read-only queries, served by a replica unless this request writes"""
+    session_maker = async_session if primary else get_read_sessionmaker()
+
+    async with session_maker() as session:
+        yield session
+
+
+def get_pool_stats() -> dict:
+    """Checkout and wait-time statistics of this worker's connection pools"""
+    return {
+        'primary': engine.pool.stats_snapshot(),
+        'replicas': [read_engine.pool.stats_snapshot() for read_engine in read_engines]
+    }
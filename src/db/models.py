@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Column, Relationship
+from sqlalchemy import Index, Integer, text
 import sqlalchemy.dialects.postgresql as pg
 from typing import List, Optional
 from datetime import datetime, date
@@ -7,6 +8,10 @@ import uuid
 
 class User(SQLModel, table=True):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ux_users_email_lower', text('lower(email)'), unique=True),  # one account per email, whatever its case
+    )
+
     uid: uuid.UUID = Field(
         default_factory=uuid.uuid4,  # Automatically generate a new UUID for each user
         sa_column=Column(
@@ -26,12 +31,12 @@ class User(SQLModel, table=True):
     is_verified: bool = Field(default=False)
     password_hash: str = Field(exclude=True)  # this field should be excluded from serialization
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
-    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now))
     books: List['Book'] = Relationship(  # This field serves not as database row but as means to access related objects
-        back_populates='user', sa_relationship_kwargs={'lazy': 'selectin'}  # to retrieve all books added by a user
+        back_populates='user', sa_relationship_kwargs={'lazy': 'raise'}  # never loaded implicitly, queries opt in with selectinload
     )  # to access the books submitted by user
     reviews: List['Review'] = Relationship(
-        back_populates='user', sa_relationship_kwargs={'lazy': 'selectin'}
+        back_populates='user', sa_relationship_kwargs={'lazy': 'raise'}
     )
 
     def __repr__(self):
@@ -39,21 +44,28 @@ class User(SQLModel, table=True):
 
 
 class BookTag(SQLModel, table=True):  # representing the association between books and tags (many-to-many relationship)
+    __table_args__ = (
+        Index('ix_booktag_tag_id', 'tag_id'),  # the books of a tag, the primary key leads with book_id
+    )
     book_id: uuid.UUID = Field(default=None, foreign_key="books.uid", primary_key=True)
     tag_id: uuid.UUID = Field(default=None, foreign_key="tags.uid", primary_key=True)
 
 
 class Tag(SQLModel, table=True):
     __tablename__ = "tags"
+    __table_args__ = (
+        Index('ix_tags_name', 'name'),  # the tag filter of the book listings
+    )
     uid: uuid.UUID = Field(
         sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
     name: str = Field(sa_column=Column(pg.VARCHAR, nullable=False))
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now))
     books: List['Book'] = Relationship(
         link_model=BookTag,  # association between Tag and Book instances is managed through the BookTag class
         back_populates="tags",
-        sa_relationship_kwargs={"lazy": "selectin"}  # configures lazy loading
+        sa_relationship_kwargs={"lazy": "raise"}  # loaded only when a query asks for it
     )
 
     def __repr__(self) -> str:
@@ -62,6 +74,19 @@ class Tag(SQLModel, table=True):
 
 class Book(SQLModel, table=True):
     __tablename__ = "books"
+    __table_args__ = (
+        Index('ix_books_created_at_uid', 'created_at', 'uid'),  # keyset pagination, scanned backwards for newest first
+        Index('ix_books_user_uid_created_at_uid', 'user_uid', 'created_at', 'uid'),  # a user's submissions
+        Index('ix_books_language_created_at_uid', 'language', 'created_at', 'uid'),
+        # one per sortable column, they also serve the equality filters on author and publisher
+        Index('ix_books_title_uid', 'title', 'uid'),
+        Index('ix_books_author_uid', 'author', 'uid'),
+        Index('ix_books_publisher_uid', 'publisher', 'uid'),
+        Index('ix_books_published_date_uid', 'published_date', 'uid'),
+        Index('ix_books_page_count_uid', 'page_count', 'uid'),
+        Index('ix_books_rating_avg_uid', 'rating_avg', 'uid'),
+        Index('ix_books_review_count_uid', 'review_count', 'uid'),
+    )
 
     uid: uuid.UUID = Field(
         default_factory=uuid.uuid4,  # Automatically generate a new UUID for each book
@@ -81,16 +106,20 @@ class Book(SQLModel, table=True):
     language: str
     user_uid: Optional[uuid.UUID] = Field(default=None,
                                           foreign_key='users.uid')  # linking each book entry to the user who submitted it
+    # kept in step with the reviews in the same transaction, rebuilt by python -m src.books.aggregates
+    review_count: int = Field(default=0, sa_column=Column(pg.INTEGER, nullable=False, server_default='0'))
+    rating_sum: int = Field(default=0, sa_column=Column(pg.INTEGER, nullable=False, server_default='0'))
+    rating_avg: float = Field(default=0, sa_column=Column(pg.DOUBLE_PRECISION, nullable=False, server_default='0'))
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
-    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now))
     user: Optional[User] = Relationship(back_populates='books')
     reviews: List['Review'] = Relationship(  # this relationship allow us to access the reviews left on a book
-        back_populates='book', sa_relationship_kwargs={'lazy': 'selectin'}  # maps to our book
+        back_populates='book', sa_relationship_kwargs={'lazy': 'raise'}  # maps to our book
     )
     tags: List[Tag] = Relationship(
         link_model=BookTag,
         back_populates="books",
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise"},
     )
 
     def __repr__(self) -> str:
@@ -99,6 +128,11 @@ class Book(SQLModel, table=True):
 
 class Review(SQLModel, table=True):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # the pages of a book's reviews, by rating or newest first
+        Index('ix_reviews_book_uid_rating_uid', 'book_uid', 'rating', 'uid'),
+        Index('ix_reviews_book_uid_created_at_uid', 'book_uid', 'created_at', 'uid'),
+    )
 
     uid: uuid.UUID = Field(
         default_factory=uuid.uuid4,
@@ -115,9 +149,33 @@ class Review(SQLModel, table=True):
                                           foreign_key='users.uid')  # linking each review to the user who submitted it
     book_uid: Optional[uuid.UUID] = Field(default=None, foreign_key='books.uid')
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
-    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now))
     user: Optional[User] = Relationship(back_populates='reviews')
     book: Optional[Book] = Relationship(back_populates='reviews')
 
     def __repr__(self) -> str:
         return f"<Review for book -> {self.book_uid} by user -> {self.user_uid}>"
+
+
+class TableVersion(SQLModel, table=True):  # bumped after every committed write it covers, see src.etag
+    __tablename__ = "table_versions"
+
+    name: str = Field(sa_column=Column(pg.VARCHAR, primary_key=True))
+    version: int = Field(default=0)
+
+    def __repr__(self) -> str:
+        return f"<TableVersion {self.name} -> {self.version}>"
+
+
+class OutboxMessage(SQLModel, table=True):  # written in the transaction of the change it announces, see src.notifications.outbox
+    __tablename__ = "outbox"
+
+    id: Optional[int] = Field(default=None, sa_column=Column(
+        pg.BIGINT().with_variant(Integer, 'sqlite'),  # sqlite only autoincrements an INTEGER primary key
+        primary_key=True, autoincrement=True  # the relay sends in id order
+    ))
+    body: str = Field(sa_column=Column(pg.TEXT, nullable=False))
+    created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+
+    def __repr__(self) -> str:
+        return f"<OutboxMessage {self.id}>"
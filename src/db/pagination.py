@@ -0,0 +1,51 @@
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional
+from src.errors import InvalidCursor
+import base64
+import json
+import uuid
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _json_default(value: Any):  # teach json how to serialize the values we paginate on
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row of a page into an opaque URL-safe cursor"""
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Unpack a cursor created by encode_cursor, raising InvalidCursor if it was tampered with"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)  # restore the padding stripped in encode_cursor
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor()
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor()
+
+    return values
+
+
+def decode_keyset_cursor(cursor: Optional[str], parse: Callable[[Any], Any]):
+    """Decode a (sort value, uid) cursor into python values, or None for the first page"""
+    if cursor is None:
+        return None
+
+    value, uid = decode_cursor(cursor, 2)
+
+    try:
+        return parse(value), uuid.UUID(uid)
+    except (TypeError, ValueError):
+        raise InvalidCursor()
@@ -0,0 +1,67 @@
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import threading
+import time
+import os
+
+
+class PoolStats:
+    """Counters about connection checkouts, kept per worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # the pool may hand out connections from the engine's sync worker threads
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0  # connections handed out
+            self.timeouts = 0  # checkouts that gave up after pool_timeout seconds
+            self.total_wait = 0.0  # seconds spent waiting for a free connection
+            self.max_wait = 0.0
+
+    def record_checkout(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                'pid': os.getpid(),  # every uvicorn worker owns its own pool
+                'pool_size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / waits * 1000, 3) if waits else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool which times how long every checkout waits for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+
+        self.stats.record_checkout(time.perf_counter() - start)
+
+        return connection
+
+    def stats_snapshot(self) -> dict:
+        return self.stats.snapshot(self)
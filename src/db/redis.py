@@ -0,0 +1,7 @@
+from redis import asyncio as aioredis  # aioredis now ships inside redis-py, the standalone package fails on python 3.11
+from src.config import Config
+
+redis_client = aioredis.from_url(  # no connection is opened until the first command
+    Config.REDIS_URL,
+    decode_responses=True  # return str instead of bytes
+)
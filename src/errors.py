@@ -64,6 +64,16 @@ class UserNotFound(BooklyException):
     pass
 
 
+class InvalidCursor(BooklyException):
+    """User has provided a malformed or tampered pagination cursor"""
+    pass
+
+
+class PasswordHashingOverloaded(BooklyException):
+    """Too many password hashes are already waiting for a worker"""
+    pass
+
+
 class AccountNotVerified(Exception):
     """Account not yet verified"""
     pass
@@ -204,6 +214,18 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        InvalidCursor,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Pagination cursor is invalid",
+                "resolution": "Use the next_cursor value returned by the previous page",
+                "error_code": "invalid_cursor",
+            },
+        ),
+    )
+
     app.add_exception_handler(
         AccountNotVerified,
         create_exception_handler(
@@ -216,6 +238,17 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        PasswordHashingOverloaded,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "The server is busy, please try again",
+                "error_code": "server_busy",
+            },
+        ),
+    )
+
 
     @app.exception_handler(500)
     async def internal_server_error(request, exc):
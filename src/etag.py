@@ -0,0 +1,57 @@
+from fastapi import Request, Response, status
+from sqlalchemy import func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.db.models import TableVersion
+from typing import Optional
+import hashlib
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the values that decide what a response contains"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag"""
+    header = request.headers.get('if-none-match')
+
+    if header is None:
+        return False
+
+    if header.strip() == '*':
+        return True
+
+    candidates = [candidate.strip() for candidate in header.split(',')]
+
+    return any(candidate.removeprefix('W/') == etag for candidate in candidates)  # If-None-Match compares weakly
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def change_markers(updated_at) -> list:
+    """
+    count(*) and max(updated_at) of the rows a response is built from, selected in the same
+    snapshot as those rows: any insert, update or delete among them changes one of the two.
+    """
+    return [func.count(), func.max(updated_at)]
+
+
+async def get_table_version(name: str, session: AsyncSession) -> Optional[int]:
+    """Write counter of a group of tables, None if the counter does not exist"""
+    result = await session.exec(select(TableVersion.version).where(TableVersion.name == name))
+
+    return result.first()
+
+
+async def bump_table_version(name: str, session: AsyncSession) -> None:
+    """
+    Count a write once it is committed, in a transaction of its own: the row is locked for
+    this one statement only, and no reader sees the new version before the data it covers.
+    """
+    await session.exec(update(TableVersion).where(TableVersion.name == name).values(version=TableVersion.version + 1))
+    await session.commit()
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends
+from src.auth.dependencies import RoleChecker
+from src.db.main import get_pool_stats
+from src.auth.utils import password_hasher
+from src.db.blocklist import token_blocklist
+from src.notifications.publisher import notification_publisher
+from src.notifications.outbox import outbox_relay
+from src.notifications.batching import notification_batcher
+from src.notifications.consumer import notification_consumer
+
+metrics_router = APIRouter()
+admin_role_checker = Depends(RoleChecker(['admin']))
+
+
+@metrics_router.get('/db-pool', dependencies=[admin_role_checker])
+async def db_pool_stats():
+    """Connection pool usage of the worker that served this request"""
+    return get_pool_stats()
+
+
+@metrics_router.get('/password-hashing', dependencies=[admin_role_checker])
+async def password_hashing_stats():
+    """Queue depth and wait times of the password hashing pool of the worker that served this request"""
+    return password_hasher.snapshot()
+
+
+@metrics_router.get('/token-blocklist', dependencies=[admin_role_checker])
+async def token_blocklist_stats():
+    """Blocklist checks of the worker that served this request, and how many the bloom filter answered alone"""
+    return token_blocklist.snapshot()
+
+
+@metrics_router.get('/notifications', dependencies=[admin_role_checker])
+async def notification_stats():
+    """Service Bus sends, batching, outbox relay and consumer of the worker that served this request"""
+    return {
+        'publisher': notification_publisher.snapshot(),
+        'batcher': notification_batcher.snapshot(),
+        'outbox': outbox_relay.snapshot(),
+        'consumer': notification_consumer.snapshot()
+    }
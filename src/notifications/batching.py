@@ -0,0 +1,184 @@
+from typing import List, Optional, Tuple
+from azure.servicebus import ServiceBusMessage
+from azure.servicebus.exceptions import MessageSizeExceededError
+from src.config import Config
+from .publisher import ServiceBusPublisher, notification_publisher
+import asyncio
+import logging
+import os
+import time
+
+FLUSH_REASONS = ('count', 'bytes', 'linger')
+
+
+class MessageBatcher:
+    """
+    In-process publish queue which coalesces the messages of concurrent publishers into
+    ServiceBusMessageBatch sends. A batch is sent once it holds `max_count` messages, once
+    the next message does not fit in `max_batch_bytes` (0 for the largest the queue takes),
+    or `linger` seconds after its first message when no more are waiting. Batches are sent
+    one at a time: messages published during a send wait in the queue and the next batch is
+    filled from them once it returns, so a spike costs a round trip per batch instead of
+    per message. Publishers wait for room once `max_pending` messages are queued.
+    """
+
+    def __init__(self, publisher: ServiceBusPublisher, max_batch_bytes: int = 0, max_count: int = 100,
+                 linger: float = 0.01, max_pending: int = 1000):
+        self.publisher = publisher
+        self.max_batch_bytes = max_batch_bytes
+        self.max_count = max_count
+        self.linger = linger
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self._carry: Optional[tuple] = None  # (message, future, queued at) which did not fit in the last batch
+        self.reset()
+
+    def reset(self) -> None:
+        self.published = 0  # messages sent
+        self.failed = 0
+        self.flushes = 0
+        self.batched = 0  # messages over all flushes, sent or not
+        self.flush_reasons = dict.fromkeys(FLUSH_REASONS, 0)
+        self.max_batch_messages = 0
+        self.total_flush = 0.0  # seconds spent sending batches
+        self.max_flush = 0.0
+        self.total_queued = 0.0  # seconds from publish to the start of the send, summed over the messages
+        self.backpressure_waits = 0  # publishers which found the queue full
+
+    def _ensure_running(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            if self._loop is not loop:  # asyncio primitives belong to the loop they were first used on
+                self._queue = asyncio.Queue(self.max_pending)
+                self._carry = None
+                self._loop = loop
+            self._task = asyncio.create_task(self._run())
+        return self._queue
+
+    async def publish(self, message: ServiceBusMessage) -> None:
+        """Queue a message and return once the batch holding it was sent, raises what the send raised"""
+        queue = self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+
+        if queue.full():
+            self.backpressure_waits += 1
+        await queue.put((message, future, time.perf_counter()))
+
+        await future
+
+    async def _next(self, timeout: Optional[float]):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        if timeout is None:
+            return await self._queue.get()
+        if timeout <= 0:
+            return self._queue.get_nowait()  # raises QueueEmpty
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _fill(self, batch, first) -> Tuple[list, str]:
+        """Add messages to the batch until a limit is reached, returns them with the reason to flush"""
+        pending = [first]
+        first_at = time.perf_counter()
+
+        while len(pending) < self.max_count:
+            try:
+                item = await self._next(0)
+            except asyncio.QueueEmpty:
+                try:  # nothing waiting, give the publishers `linger` to add to the batch
+                    item = await self._next(self.linger - (time.perf_counter() - first_at))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    return pending, 'linger'
+
+            try:
+                batch.add_message(item[0])
+            except MessageSizeExceededError:
+                self._carry = item  # opens the next batch
+                return pending, 'bytes'
+            except Exception as e:  # a message no batch takes, the rest goes out without it
+                self._settle([item], e)
+                continue
+            pending.append(item)
+
+        return pending, 'count'
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._next(None)
+            try:
+                batch = await self.publisher.create_message_batch(self.max_batch_bytes or None)
+                batch.add_message(first[0])
+            except Exception as e:  # no connection, or a message larger than any batch
+                self._settle([first], e)
+                continue
+
+            pending, reason = await self._fill(batch, first)
+
+            started = time.perf_counter()
+            try:
+                await self.publisher.send(batch)
+            except Exception as e:
+                logging.exception(e)
+                self._settle(pending, e)
+            else:
+                self._settle(pending)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.flushes += 1
+                self.batched += len(pending)
+                self.flush_reasons[reason] += 1
+                self.max_batch_messages = max(self.max_batch_messages, len(pending))
+                self.total_flush += elapsed
+                self.max_flush = max(self.max_flush, elapsed)
+                self.total_queued += sum(started - queued_at for _, _, queued_at in pending)
+
+    def _settle(self, items: List[tuple], error: Optional[Exception] = None) -> None:
+        for _, future, _ in items:
+            if future.done():  # the publisher was cancelled
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+        if error is None:
+            self.published += len(items)
+        else:
+            self.failed += len(items)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'max_pending': self.max_pending,
+            'published': self.published,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'flush_reasons': self.flush_reasons,
+            'avg_messages_per_batch': round(self.batched / self.flushes, 2) if self.flushes else 0.0,
+            'max_messages_per_batch': self.max_batch_messages,
+            'avg_flush_ms': round(self.total_flush / self.flushes * 1000, 3) if self.flushes else 0.0,
+            'max_flush_ms': round(self.max_flush * 1000, 3),
+            'avg_queued_ms': round(self.total_queued / self.batched * 1000, 3) if self.batched else 0.0,
+            'backpressure_waits': self.backpressure_waits,
+        }
+
+
+notification_batcher = MessageBatcher(
+    notification_publisher,
+    max_batch_bytes=Config.NOTIFY_BATCH_MAX_BYTES,
+    max_count=Config.NOTIFY_BATCH_MAX_COUNT,
+    linger=Config.NOTIFY_BATCH_LINGER,
+    max_pending=Config.NOTIFY_BATCH_MAX_PENDING
+)
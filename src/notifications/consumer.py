@@ -1,47 +1,243 @@
 import httpx
 from azure.servicebus.aio import ServiceBusClient
+from typing import Callable, List, Optional
 from src.config import Config
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+import zlib
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None  # httpx speaks HTTP/2 with the h2 package, pip install httpx[http2]
+BUSY_RECEIVE_WAIT = 0.05  # longest a receive holds the receiver while settlements and renewals may be waiting for it
 
 
 class NotificationConsumer:
-    def __init__(self):
+    """
+    Receives the review notifications and calls the webhook for each of them.
+
+    Up to `concurrency` messages are handled at once, by as many worker tasks; the receiver
+    prefetches `prefetch` more, and no new message is received while the workers are busy,
+    so a slow webhook leaves the rest of the queue to the other consumers. The lock of a
+    message is renewed every `lock_renewal_interval` seconds from the moment it is received,
+    also while it waits for its worker; the SDK's prefetch buffer is out of reach, keep
+    `prefetch` small enough for those messages to be received before their locks expire.
+    With `ordered` the messages of one book go to the same worker and are handled in the
+    order received. The receiver is not coroutine safe, receives, settlements and renewals
+    take turns on it, and a receive only waits for messages while none are being handled.
+    The webhook is called through one pooled HTTP client, kept alive until `stop`.
+    """
+
+    def __init__(self, concurrency: int = 1, prefetch: int = 0, lock_renewal_interval: float = 20,
+                 ordered: bool = False, max_wait_time: float = 1.0,
+                 client_factory: Callable[[str], ServiceBusClient] = ServiceBusClient.from_connection_string,
+                 webhook_limits: Optional[httpx.Limits] = None, webhook_timeout: Optional[httpx.Timeout] = None,
+                 http2: bool = False, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.connection_string = Config.AZURE_SERVICE_BUS_CONNECTION_STRING
         self.queue_name = Config.AZURE_SERVICE_BUS_QUEUE_NAME
         self.webhook_url = Config.WEBHOOK_URL
+        self.concurrency = max(1, concurrency)
+        self.prefetch = prefetch
+        self.lock_renewal_interval = lock_renewal_interval
+        self.ordered = ordered
+        self.max_wait_time = max_wait_time  # longest a receive holds the receiver while the queue is empty
+        self.client_factory = client_factory
+        self.webhook_limits = webhook_limits or httpx.Limits(
+            max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        self.webhook_timeout = webhook_timeout or httpx.Timeout(10.0)
+        self.http2 = http2 and HTTP2_AVAILABLE  # falls back to HTTP/1.1 keep-alive without h2
+        self.transport = transport
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._receiver_lock: Optional[asyncio.Lock] = None
+        self._settled: Optional[asyncio.Condition] = None  # notified whenever a message leaves the workers
+        self.reset()
+
+    def reset(self) -> None:
+        self.received = 0
+        self.completed = 0
+        self.abandoned = 0
+        self.lock_renewals = 0
+        self.in_flight = 0
+        self.total_handle = 0.0  # seconds from receive to settlement
+        self.webhook_calls = 0
+        self.webhook_failures = 0
+        self.total_webhook = 0.0  # seconds spent waiting for the webhook
 
     async def process_messages(self):
-        async with ServiceBusClient.from_connection_string(self.connection_string) as client:
-            receiver = client.get_queue_receiver(queue_name=self.queue_name)
+        self._receiver_lock = asyncio.Lock()
+        self._settled = asyncio.Condition()
+        queues = [asyncio.Queue() for _ in range(self.concurrency if self.ordered else 1)]
+
+        async with self.client_factory(self.connection_string) as client:
+            receiver = client.get_queue_receiver(queue_name=self.queue_name, prefetch_count=self.prefetch)
             async with receiver:
                 print("Listening for messages...")
-                async for message in receiver:
+                workers = [
+                    asyncio.create_task(self._work(receiver, queues[i % len(queues)]))
+                    for i in range(self.concurrency)
+                ]
+                try:
+                    await self._receive(receiver, queues)
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                    for queue in queues:  # received but never handled, their locks run out
+                        while not queue.empty():
+                            *_, renewal = queue.get_nowait()
+                            if renewal is not None:
+                                renewal.cancel()
+
+    async def _receive(self, receiver, queues: List[asyncio.Queue]):
+        while True:
+            async with self._settled:  # wait for a free worker before taking more messages off the queue
+                await self._settled.wait_for(lambda: self.in_flight < self.concurrency)
+            free = self.concurrency - self.in_flight
+            busy = self.in_flight > 0  # settlements and renewals cannot wait for a long receive
+
+            async with self._receiver_lock:
+                messages = await receiver.receive_messages(
+                    max_message_count=free, max_wait_time=BUSY_RECEIVE_WAIT if busy else self.max_wait_time)
+
+            for message in messages:
+                self.received += 1
+                self.in_flight += 1
+                renewal = asyncio.create_task(self._renew_lock(receiver, message)) if self.lock_renewal_interval else None
+                body = self.decode(message)
+                key = zlib.crc32(body.split('|')[0].encode('utf-8'))  # the book title, stable across workers
+                queues[key % len(queues)].put_nowait((message, body, time.perf_counter(), renewal))
+
+            if not messages and busy:  # the queue is empty, leave the receiver to the workers until one is done
+                async with self._settled:
                     try:
-                        # 1. decode the message body
-                        body = ''.join(  # message isinstance(message.body, (list, Generator)
-                            part.decode('utf-8') if isinstance(part, bytes) else str(part) for part in message.body)
+                        await asyncio.wait_for(self._settled.wait(), self.max_wait_time)
+                    except asyncio.TimeoutError:
+                        pass
 
-                        print(f"Received message: {body}")
-                        book_title, review_content = body.split('|')
+    @staticmethod
+    def decode(message) -> str:
+        return ''.join(  # message isinstance(message.body, (list, Generator)
+            part.decode('utf-8') if isinstance(part, bytes) else str(part) for part in message.body)
 
-                        # 2. invoke the webhook
-                        await self.invoke_webhook(book_title, review_content)
+    async def _work(self, receiver, queue: asyncio.Queue):
+        while True:
+            message, body, received_at, renewal = await queue.get()  # its lock is renewed since it was received
+            try:
+                await self.handle_message(receiver, message, body)
+            except Exception as e:  # could not even abandon it, the lock runs out and it is redelivered
+                logging.exception(e)
+            finally:
+                if renewal is not None:
+                    renewal.cancel()
+                self.in_flight -= 1
+                self.total_handle += time.perf_counter() - received_at
+                async with self._settled:
+                    self._settled.notify()
 
-                        # 3. mark the message as completed
-                        await receiver.complete_message(message)
-                        print("Message completed and removed from the queue.")
-                    except Exception as e:
-                        print(f"Error processing message: {e}")
-                        await receiver.abandon_message(message)
+    async def _renew_lock(self, receiver, message):
+        while True:
+            await asyncio.sleep(self.lock_renewal_interval)
+            try:
+                async with self._receiver_lock:
+                    await receiver.renew_message_lock(message)
+                self.lock_renewals += 1
+            except Exception as e:  # the message is redelivered once its lock runs out, handled twice at worst
+                logging.exception(e)
+                return
+
+    async def handle_message(self, receiver, message, body: str):
+        try:
+            # 1. split the message body, decoded when it was received
+            print(f"Received message: {body}")
+            book_title, review_content = body.split('|')
+
+            # 2. invoke the webhook
+            await self.invoke_webhook(book_title, review_content)
+
+            # 3. mark the message as completed
+            async with self._receiver_lock:
+                await receiver.complete_message(message)
+            self.completed += 1
+            print("Message completed and removed from the queue.")
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            async with self._receiver_lock:
+                await receiver.abandon_message(message)
+            self.abandoned += 1
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=self.webhook_limits, timeout=self.webhook_timeout, http2=self.http2, transport=self.transport)
+        return self._http_client
 
     async def invoke_webhook(self, book_name: str, review_content: str):
-        async with httpx.AsyncClient() as client:
+        client = self._get_http_client()  # keeps its connections to the webhook open between messages
+        start = time.perf_counter()
+        try:
+            payload = {"book_title": book_name, "message": f"New review added: {review_content}"}
+            response = await client.post(self.webhook_url, json=payload)
+            if response.status_code == 200:
+                print("Webhook invoked successfully.")
+            else:
+                print(f"Failed to invoke webhook: {response.status_code}, {response.text}")
+        except Exception as e:
+            self.webhook_failures += 1
+            print(f"Error invoking webhook: {e}")
+            raise
+        finally:
+            self.webhook_calls += 1
+            self.total_webhook += time.perf_counter() - start
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.process_messages())
+
+    async def stop(self) -> None:
+        """Stop receiving, messages still being handled are abandoned by their lock running out"""
+        if self._task is not None:
+            self._task.cancel()
             try:
-                payload = {"book_title": book_name, "message": f"New review added: {review_content}"}
-                response = await client.post(self.webhook_url, json=payload)
-                if response.status_code == 200:
-                    print("Webhook invoked successfully.")
-                else:
-                    print(f"Failed to invoke webhook: {response.status_code}, {response.text}")
-            except Exception as e:
-                print(f"Error invoking webhook: {e}")
-                raise
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.close()
+
+    async def close(self) -> None:
+        if self._http_client is not None:
+            client, self._http_client = self._http_client, None
+            await client.aclose()
+
+    def snapshot(self) -> dict:
+        settled = self.completed + self.abandoned
+        return {
+            'pid': os.getpid(),
+            'concurrency': self.concurrency,
+            'prefetch': self.prefetch,
+            'ordered': self.ordered,
+            'in_flight': self.in_flight,
+            'received': self.received,
+            'completed': self.completed,
+            'abandoned': self.abandoned,
+            'lock_renewals': self.lock_renewals,
+            'avg_handle_ms': round(self.total_handle / settled * 1000, 3) if settled else 0.0,
+            'webhook_http2': self.http2,
+            'webhook_calls': self.webhook_calls,
+            'webhook_failures': self.webhook_failures,
+            'avg_webhook_ms': round(self.total_webhook / self.webhook_calls * 1000, 3) if self.webhook_calls else 0.0,
+        }
+
+
+notification_consumer = NotificationConsumer(
+    concurrency=Config.NOTIFY_CONSUMER_CONCURRENCY,
+    prefetch=Config.NOTIFY_CONSUMER_PREFETCH,
+    lock_renewal_interval=Config.NOTIFY_CONSUMER_LOCK_RENEWAL,
+    ordered=Config.NOTIFY_CONSUMER_ORDERED,
+    webhook_limits=httpx.Limits(max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+                                max_keepalive_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+                                keepalive_expiry=Config.WEBHOOK_KEEPALIVE_EXPIRY),
+    webhook_timeout=httpx.Timeout(Config.WEBHOOK_TIMEOUT, connect=Config.WEBHOOK_CONNECT_TIMEOUT),
+    http2=Config.WEBHOOK_HTTP2
+)
@@ -0,0 +1,129 @@
+from typing import Optional
+from azure.servicebus import ServiceBusMessage
+from azure.servicebus.exceptions import MessageSizeExceededError
+from sqlalchemy import delete
+from sqlmodel import select
+from src.config import Config
+from src.db.main import async_session
+from src.db.models import OutboxMessage
+from .batching import MessageBatcher, notification_batcher
+import asyncio
+import logging
+import os
+import time
+
+MAX_RETRY_DELAY = 30  # seconds between attempts while the broker keeps failing
+
+
+class OutboxRelay:
+    """
+    Publishes the rows of the outbox table in id order and deletes them once sent.
+    Requests only insert a row next to their change and commit, delivery is at least once:
+    a crash between the send and the delete sends a batch again, with the same message ids
+    so a queue with duplicate detection drops the copies. Rows are claimed with
+    FOR UPDATE SKIP LOCKED, every worker can run a relay.
+    """
+
+    def __init__(self, batcher: MessageBatcher, session_maker=async_session, batch_size: int = 100,
+                 poll_interval: float = 1.0):
+        self.batcher = batcher  # coalesces the rows into as few sends as its limits allow
+        self.session_maker = session_maker
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval  # picks up the rows of other workers and of a failed run
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.relayed = 0
+        self.failures = 0
+        self.dropped = 0  # messages too large to ever fit in a batch
+        self.last_error: Optional[str] = None
+        self.last_relay_at: Optional[float] = None
+
+    def notify(self) -> None:
+        """A row was committed, send it now instead of at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def relay_batch(self) -> int:
+        """Send and delete up to batch_size rows in one transaction, returns how many"""
+        async with self.session_maker() as session:
+            statement = (
+                select(OutboxMessage)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)  # rows another relay is sending are left to it
+            )
+            rows = (await session.exec(statement)).all()
+
+            if not rows:
+                return 0
+
+            messages = [ServiceBusMessage(row.body, message_id=f'outbox-{row.id}') for row in rows]
+            results = await asyncio.gather(*map(self.batcher.publish, messages), return_exceptions=True)
+
+            for row, result in zip(rows, results):
+                if isinstance(result, MessageSizeExceededError):  # would never fit, retrying cannot help
+                    logging.error(f"Dropping outbox message {row.id}, it is larger than a batch: {row.body[:200]!r}")
+                    self.dropped += 1
+                elif isinstance(result, BaseException):  # nothing is deleted, the sent ones go out again
+                    raise result
+
+            await session.exec(delete(OutboxMessage).where(OutboxMessage.id.in_([row.id for row in rows])))
+            await session.commit()
+
+        self.relayed += len(rows)
+        self.last_relay_at = time.time()
+
+        return len(rows)
+
+    async def run(self) -> None:
+        self._wakeup = asyncio.Event()
+        failures = 0
+
+        while True:
+            try:
+                relayed = await self.relay_batch()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # the rows stay in the outbox, tried again after a growing delay
+                logging.exception(e)
+                self.failures += 1
+                self.last_error = repr(e)
+                failures += 1
+                await asyncio.sleep(min(self.poll_interval * 2 ** failures, MAX_RETRY_DELAY))
+                continue
+
+            if relayed == self.batch_size:  # more rows are waiting
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'relayed': self.relayed,
+            'failures': self.failures,
+            'dropped': self.dropped,
+            'last_error': self.last_error,
+            'seconds_since_relay': round(time.time() - self.last_relay_at, 3) if self.last_relay_at else None,
+        }
+
+
+outbox_relay = OutboxRelay(notification_batcher, batch_size=Config.OUTBOX_BATCH_SIZE,
+                           poll_interval=Config.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,129 @@
+from typing import Callable, Optional
+from azure.servicebus.aio import ServiceBusClient
+from azure.servicebus.exceptions import MessageSizeExceededError, ServiceBusError
+from src.config import Config
+import asyncio
+import logging
+import os
+import time
+
+
+class ServiceBusPublisher:
+    """
+    One Service Bus client and queue sender per process, opened when the app starts and
+    reused by every request, so a publish costs a send instead of an AMQP connect and
+    handshake. A sender which fails past the SDK's own retries is thrown away and the
+    send is tried once more on a new connection. The SDK's handlers are not coroutine
+    safe, sends take turns on the sender; batch the messages to send more at once.
+    """
+
+    def __init__(self, connection_string: str, queue_name: str,
+                 client_factory: Callable[[str], ServiceBusClient] = ServiceBusClient.from_connection_string):
+        self.connection_string = connection_string
+        self.queue_name = queue_name
+        self.client_factory = client_factory
+        self._client: Optional[ServiceBusClient] = None
+        self._sender = None
+        self._lock: Optional[asyncio.Lock] = None  # guards connecting and discarding
+        self._send_lock: Optional[asyncio.Lock] = None
+        self._loop = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.sent = 0  # send_messages calls which succeeded
+        self.failed = 0
+        self.connects = 0
+        self.total_send = 0.0  # seconds spent in send_messages, connecting included
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # asyncio primitives belong to the loop they were first used on
+            self._lock = asyncio.Lock()
+            self._send_lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _get_send_lock(self) -> asyncio.Lock:
+        self._get_lock()
+        return self._send_lock
+
+    async def _get_sender(self):
+        if self._sender is not None:
+            return self._sender
+
+        async with self._get_lock():  # concurrent first sends share one connection
+            if self._sender is None:
+                client = self.client_factory(self.connection_string)
+                sender = client.get_queue_sender(queue_name=self.queue_name)
+                try:
+                    await sender.__aenter__()  # opens the link now instead of in the middle of a send
+                except Exception:
+                    await client.close()
+                    raise
+                self._client, self._sender = client, sender
+                self.connects += 1
+
+        return self._sender
+
+    async def start(self) -> None:
+        """Connect ahead of the first request, a broker which is down only delays that to the first send"""
+        try:
+            await self._get_sender()
+        except Exception as e:
+            logging.exception(e)
+
+    async def send(self, message) -> None:
+        """Send a ServiceBusMessage, a list of them or a ServiceBusMessageBatch"""
+        start = time.perf_counter()
+        try:
+            async with self._get_send_lock():
+                sender = await self._get_sender()
+                try:
+                    await sender.send_messages(message)
+                except MessageSizeExceededError:
+                    raise
+                except ServiceBusError as e:  # the connection may be broken for good, reconnect and try once more
+                    logging.warning(f"Service Bus send failed, reconnecting: {e}")
+                    await self._discard(sender)
+                    await (await self._get_sender()).send_messages(message)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_send += time.perf_counter() - start
+
+        self.sent += 1
+
+    async def create_message_batch(self, max_size_in_bytes: Optional[int] = None):
+        """Empty ServiceBusMessageBatch, by default limited to the largest message the queue accepts"""
+        return await (await self._get_sender()).create_message_batch(max_size_in_bytes=max_size_in_bytes)
+
+    async def _discard(self, sender) -> None:
+        async with self._get_lock():
+            if self._sender is not sender:  # another send replaced it already
+                return
+            client, self._client, self._sender = self._client, None, None
+
+        for handler in (sender, client):
+            try:
+                await handler.close()
+            except Exception as e:
+                logging.exception(e)
+
+    async def close(self) -> None:
+        if self._sender is not None:
+            await self._discard(self._sender)
+
+    def snapshot(self) -> dict:
+        calls = self.sent + self.failed
+        return {
+            'pid': os.getpid(),  # every uvicorn worker owns its own sender
+            'connected': self._sender is not None,
+            'connects': self.connects,
+            'sent': self.sent,
+            'failed': self.failed,
+            'avg_send_ms': round(self.total_send / calls * 1000, 3) if calls else 0.0,
+        }
+
+
+notification_publisher = ServiceBusPublisher(Config.AZURE_SERVICE_BUS_CONNECTION_STRING, Config.AZURE_SERVICE_BUS_QUEUE_NAME)
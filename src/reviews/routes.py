@@ -1,13 +1,36 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from src.db.models import User
-from src.auth.dependencies import get_current_user
-from src.db.main import get_session
+from src.auth.dependencies import RoleChecker, get_current_user
+from src.db.main import get_session, get_read_session
+from src.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from src.etag import etag_matches, not_modified
 from sqlmodel.ext.asyncio.session import AsyncSession
-from .schemas import ReviewCreateModel
+from typing import Optional
+from .schemas import ReviewCreateModel, ReviewPage, ReviewSort
 from .service import ReviewService
 
 review_service = ReviewService()
 review_router = APIRouter()
+user_role_checker = Depends(RoleChecker(['user', 'admin']))
+
+
+@review_router.get('/book/{book_uid}', response_model=ReviewPage, dependencies=[user_role_checker])
+async def get_book_reviews(
+        book_uid: str,
+        request: Request,
+        response: Response,
+        sort: ReviewSort = 'newest',
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,  # next_cursor of the previous page
+        session: AsyncSession = Depends(get_read_session)
+):
+    etag = await review_service.get_reviews_etag(session, book_uid, sort, limit, cursor)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
+
+    reviews = await review_service.get_book_reviews(book_uid, session, sort=sort, limit=limit, cursor=cursor)
+    return reviews
 
 
 @review_router.post('/book/{book_uid}')
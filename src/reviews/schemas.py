@@ -1,10 +1,12 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 import uuid
 
 
 class ReviewModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     uid: uuid.UUID
     rating: int = Field(lt=5)
     review_text: str
@@ -17,3 +19,11 @@ class ReviewModel(BaseModel):
 class ReviewCreateModel(BaseModel):
     rating: int = Field(lt=5)
     review_text: str
+
+
+class ReviewPage(BaseModel):  # one page of the reviews of a book
+    items: List[ReviewModel]
+    next_cursor: Optional[str] = None  # pass it back as ?cursor= with the same sort, None on the last page
+
+
+ReviewSort = Literal['newest', 'rating']  # rating sorts the best reviews first
@@ -1,26 +1,32 @@
-from src.db.models import Review
+from src.db.models import Book, OutboxMessage, Review
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel import select, desc
+from sqlalchemy import tuple_
 from fastapi.exceptions import HTTPException
 from fastapi import status
-from .schemas import ReviewCreateModel
+from .schemas import ReviewCreateModel, ReviewPage, ReviewSort
+from src.db.pagination import DEFAULT_PAGE_SIZE, encode_cursor, decode_keyset_cursor
+from src.etag import make_etag, change_markers
+from src.errors import BookNotFound
+from datetime import datetime
+from typing import Optional
 from ..auth.routes import user_service
 from ..books.routes import book_service
-from azure.servicebus.aio import ServiceBusClient
-from azure.servicebus import ServiceBusMessage
+from src.notifications.outbox import outbox_relay
 
-from src.config import Config
+REVIEW_SORTS = {  # sort -> (column, parser of its cursor value), ties broken by uid
+    'newest': (Review.created_at, datetime.fromisoformat),
+    'rating': (Review.rating, int),
+}
 
 
 class ReviewService:
-    def __init__(self):
-        self.connection_string = Config.AZURE_SERVICE_BUS_CONNECTION_STRING
-        self.queue_name = Config.AZURE_SERVICE_BUS_QUEUE_NAME
-
     async def add_review_to_book(self, user_email: str, book_uid: str, review_data: ReviewCreateModel, session: AsyncSession):
         try:
             book = await book_service.get_book(
                 book_uid=book_uid,
-                session=session
+                session=session,
+                load_relationships=False  # a popular book has far too many reviews to load them all
             )
             user = await user_service.get_user_by_email(
                 email=user_email,
@@ -45,28 +51,49 @@ class ReviewService:
             new_review.user = user  # associate review with the user
             new_review.book = book  # associate review with the book
             session.add(new_review)
+            await book_service.apply_review_change(book.uid, session, 1, new_review.rating)  # committed with the review
+            # Step 5: Notify the book uploader via Azure Service Bus, sent by the outbox relay once committed
+            session.add(OutboxMessage(body=f"{book.title}|{review_data.review_text}"))
             await session.commit()
-
-            # Step 5: Notify the book uploader via Azure Service Bus
-            await self.send_service_bus_message(book.title, review_data.review_text)
+            await book_service.invalidate_book(book.uid, session, listings=False, ratings=True)  # reviews show up in the detail and the ratings
+            outbox_relay.notify()
 
             return new_review
         except Exception as e:
             print(f"Error adding review to book: {e}")
             raise
 
-    async def send_service_bus_message(self, book_name: str, review_content: str):
-        try:
-            print("Attempt to connect to Azure Service Bus.")
-            async with ServiceBusClient.from_connection_string(self.connection_string) as client:
-                print("Attempt to get the queue name")
-                sender = client.get_queue_sender(queue_name=self.queue_name)
-                async with sender:
-                    print("Making the message")
-                    message = ServiceBusMessage(f"{book_name}|{review_content}")
-                    print("Trying to send to message")
-                    await sender.send_messages(message)
-                    print("Message sent to Azure Service Bus.")
-        except Exception as e:
-            print(f"Error sending message to Azure Service Bus: {e}")
-            raise
+    async def get_book_reviews(self, book_uid: str, session: AsyncSession, sort: ReviewSort = 'newest',
+                               limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> ReviewPage:
+        """Keyset-paginated reviews of a book, highest (sort column, uid) first"""
+        sort_column, parse = REVIEW_SORTS[sort]
+        after = decode_keyset_cursor(cursor, parse)
+
+        statement = select(Review).where(Review.book_uid == book_uid)
+
+        if after is not None:
+            statement = statement.where(tuple_(sort_column, Review.uid) < tuple_(*after))
+
+        statement = statement.order_by(desc(sort_column), desc(Review.uid)).limit(limit + 1)
+
+        result = await session.exec(statement)
+
+        reviews = result.all()
+
+        if not reviews and cursor is None:  # tell an unknown book apart from a book nobody reviewed yet
+            result = await session.exec(select(Book.uid).where(Book.uid == book_uid))
+            if result.first() is None:
+                raise BookNotFound()
+
+        next_cursor = None
+        if len(reviews) > limit:
+            reviews = reviews[:limit]
+            next_cursor = encode_cursor(getattr(reviews[-1], sort_column.key), reviews[-1].uid)
+
+        return ReviewPage(items=reviews, next_cursor=next_cursor)
+
+    async def get_reviews_etag(self, session: AsyncSession, book_uid: str, *key_parts) -> str:
+        """ETag of a page of a book's reviews, it changes with every write to the reviews of the book"""
+        result = await session.exec(select(*change_markers(Review.updated_at)).where(Review.book_uid == book_uid))
+
+        return make_etag('reviews', *result.one(), book_uid, *key_parts)
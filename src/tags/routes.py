@@ -1,11 +1,12 @@
 from typing import List
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, status, Request, Response
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.auth.dependencies import RoleChecker
 from src.books.schemas import Book
-from src.db.main import get_session
+from src.db.main import get_session, get_read_session
 from .schemas import TagAddModel, TagCreateModel, TagModel
 from .service import TagService
+from src.etag import etag_matches, not_modified
 
 tags_router = APIRouter()
 tag_service = TagService()
@@ -14,7 +15,12 @@ user_role_checker = Depends(RoleChecker(["user", "admin"]))
 
 @tags_router.get("/", response_model=List[TagModel],
                  dependencies=[user_role_checker])  # fetches all tags from the database
-async def get_all_tags(session: AsyncSession = Depends(get_session)):
+async def get_all_tags(request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
+    etag = await tag_service.get_tags_etag(session)
+    if etag_matches(request, etag):  # the client's copy is still current
+        return not_modified(etag)
+    response.headers['ETag'] = etag
+
     tags = await tag_service.get_tags(session)
 
     return tags  # returning a list of tags in the response model TagModel
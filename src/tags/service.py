@@ -2,9 +2,11 @@ from fastapi import status
 from fastapi.exceptions import HTTPException
 from sqlmodel import desc, select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload
 from src.books.service import BookService
-from src.db.models import Tag
+from src.db.models import Book, Tag, BookTag
 from .schemas import TagAddModel, TagCreateModel
+from src.etag import make_etag, change_markers
 from src.errors import BookNotFound, TagNotFound, TagAlreadyExists
 
 book_service = BookService()
@@ -25,12 +27,22 @@ class TagService:
 
         return result.all()
 
+    async def get_tags_etag(self, session: AsyncSession) -> str:
+        """ETag of the tag list, it changes with every write to the tags table"""
+        result = await session.exec(select(*change_markers(Tag.updated_at)))
+
+        return make_etag('tags', *result.one())
+
     async def add_tags_to_book(
             self, book_uid: str, tag_data: TagAddModel, session: AsyncSession
     ):
         """Add tags to a book"""
 
-        book = await book_service.get_book(book_uid=book_uid, session=session)  # to verify the existence of the book
+        result = await session.exec(  # only the tags are loaded, they are appended to
+            select(Book).where(Book.uid == book_uid).options(selectinload(Book.tags))
+        )
+
+        book = result.first()
 
         if not book:  # if the book is not found -> raise an exception
             raise BookNotFound()
@@ -47,6 +59,7 @@ class TagService:
             book.tags.append(tag)
         session.add(book)
         await session.commit()
+        await book_service.invalidate_book(book.uid, session, listings=False, tags=True)  # the detail and the ?tag= pages
         await session.refresh(book)
         return book
 
@@ -97,16 +110,33 @@ class TagService:
 
             await session.refresh(tag)
 
+        result = await session.exec(select(BookTag.book_id).where(BookTag.tag_id == tag.uid))
+
+        # the renamed tag is embedded in the cached detail of its books
+        await book_service.invalidate_books(result.all(), session, listings=False, tags=True)
+
         return tag
 
     async def delete_tag(self, tag_uid: str, session: AsyncSession):
         """Delete a tag"""
 
-        tag = await self.get_tag_by_uid(tag_uid, session)
+        statement = (
+            select(Tag)
+            .where(Tag.uid == tag_uid)
+            .options(selectinload(Tag.books))  # the book links have to be loaded so they get removed with the tag
+        )
+
+        result = await session.exec(statement)
+
+        tag = result.first()
 
         if not tag:  # if not found raise an exception
             raise TagNotFound()
 
+        book_uids = [book.uid for book in tag.books]
+
         await session.delete(tag)  # deletes a tag identified by tag_uid from the database
 
         await session.commit()
+
+        await book_service.invalidate_books(book_uids, session, listings=False, tags=True)
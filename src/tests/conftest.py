@@ -1,10 +1,13 @@
 from src.auth.routes import role_checker
 from src.auth.dependencies import AccessTokenBearer, RoleChecker, RefreshTokenBearer
 from src.books.routes import access_token_bearer
-from src.db.main import get_session
+from src.db.main import get_session, get_read_session
 from src import app
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
 from unittest.mock import Mock
+import pytest_asyncio
 import pytest
 
 mock_session = Mock()
@@ -21,6 +24,7 @@ refresh_token_bearer = RefreshTokenBearer()
 role_checker = RoleChecker(['admin'])
 
 app.dependency_overrides[get_session] = get_mock_session
+app.dependency_overrides[get_read_session] = get_mock_session
 app.dependency_overrides[role_checker] = Mock()
 app.dependency_overrides[refresh_token_bearer] = Mock()
 
@@ -43,3 +47,15 @@ def fake_book_service():
 @pytest.fixture
 def test_client():
     return TestClient(app)
+
+
+@pytest_asyncio.fixture
+async def engine():  # throwaway in-memory database for tests which need real queries
+    engine = create_async_engine('sqlite+aiosqlite://')
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    yield engine
+
+    await engine.dispose()
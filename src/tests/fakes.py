@@ -0,0 +1,190 @@
+from azure.servicebus import ServiceBusMessageBatch
+from azure.servicebus.exceptions import ServiceBusConnectionError
+import asyncio
+import time
+
+
+class FakeRedis:
+    """In-memory stand-in for the handful of redis commands the app uses"""
+
+    def __init__(self):
+        self.store = {}  # key -> (value, expires_at or None)
+        self.sorted_sets = {}  # key -> {member: score}
+
+    def _alive(self, key):
+        entry = self.store.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.store[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._alive(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = (str(value), time.monotonic() + ex if ex is not None else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+    async def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def zrangebyscore(self, key, min, max):
+        members = self.sorted_sets.get(key, {})
+        return sorted((m for m, score in members.items() if float(min) <= score <= float(max)), key=members.get)
+
+    async def zremrangebyscore(self, key, min, max):
+        members = self.sorted_sets.get(key, {})
+        removed = [m for m, score in members.items() if float(min) <= score <= float(max)]
+        for member in removed:
+            del members[member]
+        return len(removed)
+
+
+class FakeServiceBus:
+    """
+    In-memory stand-in for a Service Bus namespace. Pass `from_connection_string` where a
+    ServiceBusClient factory is expected; the latencies mimic a remote broker.
+    """
+
+    def __init__(self, connect_latency: float = 0.0, send_latency: float = 0.0, max_batch_bytes: int = 262144):
+        self.max_batch_bytes = max_batch_bytes  # 256 KB, the standard tier limit
+        self.connect_latency = connect_latency  # AMQP connect, auth and link attach
+        self.send_latency = send_latency  # one round trip per send_messages call
+        self.queues = {}  # queue name -> list of message bodies
+        self.completed = []  # bodies, in the order their messages were completed
+        self.connects = 0
+        self.sends = 0
+        self.fail_sends = 0  # the next sends raise, as after a dropped connection
+
+    def from_connection_string(self, conn_str, **kwargs):
+        return FakeServiceBusClient(self)
+
+
+class FakeServiceBusClient:
+    def __init__(self, bus: FakeServiceBus):
+        self.bus = bus
+
+    def get_queue_sender(self, queue_name, **kwargs):
+        return FakeServiceBusSender(self.bus, queue_name)
+
+    def get_queue_receiver(self, queue_name, prefetch_count=0, **kwargs):
+        return FakeServiceBusReceiver(self.bus, queue_name, prefetch_count)
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class FakeServiceBusSender:
+    def __init__(self, bus: FakeServiceBus, queue_name: str):
+        self.bus = bus
+        self.queue_name = queue_name
+        self.open = False
+        self.sending = False
+
+    async def _open(self):
+        if not self.open:
+            await asyncio.sleep(self.bus.connect_latency)
+            self.bus.connects += 1
+            self.open = True
+
+    async def send_messages(self, message):
+        assert not self.sending, 'the sender is not coroutine safe, sends must take turns'
+        self.sending = True
+        try:
+            await self._open()
+            await asyncio.sleep(self.bus.send_latency)
+        finally:
+            self.sending = False
+
+        if self.bus.fail_sends:
+            self.bus.fail_sends -= 1
+            self.open = False
+            raise ServiceBusConnectionError(message='Connection lost')
+
+        messages = message if isinstance(message, list) else getattr(message, '_messages', [message])
+        self.bus.queues.setdefault(self.queue_name, []).extend(str(m) for m in messages)
+        self.bus.sends += 1
+
+    async def create_message_batch(self, max_size_in_bytes=None):
+        await self._open()
+        return ServiceBusMessageBatch(max_size_in_bytes=max_size_in_bytes or self.bus.max_batch_bytes)
+
+    async def close(self):
+        self.open = False
+
+    async def __aenter__(self):
+        await self._open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class FakeReceivedMessage:
+    def __init__(self, body: str, delivery_count: int = 0):
+        self.body = [body.encode('utf-8')]  # a generator of bytes sections in the SDK
+        self.delivery_count = delivery_count
+        self.lock_renewals = 0
+
+
+class FakeServiceBusReceiver:
+    """Peek-lock receiver, a round trip per receive (unless prefetching) and per settlement"""
+
+    def __init__(self, bus: FakeServiceBus, queue_name: str, prefetch_count: int = 0):
+        self.bus = bus
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        self.busy = False
+
+    async def _call(self, latency: float):
+        assert not self.busy, 'the receiver is not coroutine safe, calls must take turns'
+        self.busy = True
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            self.busy = False
+
+    async def receive_messages(self, max_message_count=1, max_wait_time=None):
+        queue = self.bus.queues.setdefault(self.queue_name, [])
+        if not queue:
+            await self._call(min(max_wait_time or 0.01, 0.01))  # a short wait stands in for max_wait_time
+            return []
+
+        await self._call(0 if self.prefetch_count else self.bus.send_latency)  # prefetched ones are already here
+        taken = queue[:max_message_count]
+        del queue[:max_message_count]
+
+        return [body if isinstance(body, FakeReceivedMessage) else FakeReceivedMessage(body) for body in taken]
+
+    async def complete_message(self, message):
+        await self._call(self.bus.send_latency)
+        self.bus.completed.append(message.body[0].decode('utf-8'))
+
+    async def abandon_message(self, message):
+        await self._call(self.bus.send_latency)
+        message.delivery_count += 1
+        self.bus.queues[self.queue_name].append(message)  # redelivered
+
+    async def renew_message_lock(self, message):
+        await self._call(self.bus.send_latency)
+        message.lock_renewals += 1
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,86 @@
+from src.db.blocklist import FilteredBlocklist, InMemoryBlocklist, RedisBlocklist
+from src.db.bloom import BloomFilter
+from src.tests.fakes import FakeRedis
+from unittest.mock import AsyncMock, patch
+import asyncio
+import time
+import pytest
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', [lambda: InMemoryBlocklist(), lambda: RedisBlocklist(FakeRedis())])
+async def test_revoked_tokens_are_blocked_until_they_expire(backend):
+    blocklist = backend()
+    now = time.time()
+
+    await blocklist.add('revoked', now + 60)
+    await blocklist.add('already-expired', now - 1)
+
+    assert await blocklist.contains('revoked')
+    assert not await blocklist.contains('already-expired')
+    assert not await blocklist.contains('never-revoked')
+
+    with patch('src.db.blocklist.time.time', return_value=now + 61), \
+            patch('src.tests.fakes.time.monotonic', return_value=time.monotonic() + 61):
+        assert not await blocklist.contains('revoked')
+
+
+@pytest.mark.asyncio
+async def test_redis_entries_expire_with_the_token():
+    client = FakeRedis()
+    now = time.time()
+
+    await RedisBlocklist(client, prefix='bl:').add('revoked', now + 90.2)
+
+    value, expires_at = client.store['bl:revoked']
+    assert 90 < expires_at - time.monotonic() <= 91
+
+
+@pytest.mark.asyncio
+async def test_memory_blocklist_is_swept_and_bounded():
+    blocklist = InMemoryBlocklist(max_entries=3)
+    now = time.time()
+
+    for i in range(3):
+        await blocklist.add(f'short-{i}', now + 10 + i)
+    await blocklist.add('long', now + 3600)  # over the cap, the revocation closest to expiry goes
+
+    assert len(blocklist) == 3
+    assert not await blocklist.contains('short-0')
+    assert await blocklist.contains('long')
+
+    with patch('src.db.blocklist.time.time', return_value=now + 100):
+        await blocklist.add('later', now + 3600)  # the expired entries are swept on the way
+
+    assert len(blocklist) == 2
+
+
+@pytest.mark.asyncio
+async def test_filter_skips_the_store_for_tokens_never_revoked():
+    store = RedisBlocklist(FakeRedis())
+    blocklist = FilteredBlocklist(store, sync_interval=60)
+    now = time.time()
+
+    await store.add('revoked-elsewhere', now + 60)  # by another worker, before the first sync
+    assert await blocklist.contains('revoked-elsewhere')  # no filter yet, asks the store and starts a sync
+    await asyncio.sleep(0)
+
+    await blocklist.add('revoked-here', now + 60)
+    store.contains = AsyncMock(wraps=store.contains)
+
+    assert await blocklist.contains('revoked-elsewhere')
+    assert await blocklist.contains('revoked-here')
+    for i in range(1000):
+        assert not await blocklist.contains(f'valid-{i}')
+
+    stats = blocklist.snapshot()
+    assert store.contains.await_count == 2 + stats['false_positives']
+    assert stats['lookups_avoided'] + stats['false_positives'] == 1000
+    assert stats['false_positive_rate'] < 0.05
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.from_items((str(i) for i in range(5000)), capacity=5000, error_rate=0.01)
+
+    assert all(str(i) in bloom for i in range(5000))
+    assert sum(f'other-{i}' in bloom for i in range(10000)) < 200
@@ -1,3 +1,5 @@
+from src.books.search import build_prefix_tsquery
+
 book_prefix = f'/api/v1/books'
 
 
@@ -8,3 +10,9 @@ def test_get_all_books(test_client, fake_book_service, fake_session):
 
     assert fake_book_service.get_all_books_called_once()
     assert fake_book_service.get_all_books_called_once_with(fake_session)
+
+
+def test_search_text_becomes_prefix_tsquery():
+    assert build_prefix_tsquery("The Lord's R!ng | x") == 'the:* & lord:* & s:* & r:* & ng:* & x:*'
+    assert build_prefix_tsquery('  &|!:* ') is None
+    assert build_prefix_tsquery('lord ring', '|') == 'lord:* | ring:*'
@@ -0,0 +1,89 @@
+from src.books.bulk import iter_lines, iter_records
+from src.books.service import BookService
+from src.cache import NullCache
+from src.db.models import Book
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from datetime import date
+import uuid
+import pytest
+
+NDJSON_FEED = (
+    '{"title": "Dune", "author": "Frank Herbert", "publisher": "Chilton", "published_date": "1965-08-01", '
+    '"page_count": 412, "language": "en"}\n'
+    '{"title": "No author"}\n'
+    'not json\n'
+    '\n'
+    '{"title": "Café", "author": "A", "publisher": "P", "published_date": "2001-02-03", '
+    '"page_count": "96", "language": "fr"}\n'
+).encode('utf-8')
+
+
+async def stream(data: bytes, chunk_size: int = 7):  # small chunks cut lines and characters in half
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_import_books_reports_bad_rows_and_keeps_going(engine):
+    book_service = BookService(cache=NullCache())
+    records = iter_records(iter_lines(stream(NDJSON_FEED)), 'ndjson')
+
+    async with AsyncSession(engine) as session:
+        result = await book_service.import_books(records, str(uuid.uuid4()), session, batch_size=1)
+        titles = (await session.exec(select(Book.title))).all()
+
+    assert result.inserted == 2
+    assert [error.line for error in result.errors] == [2, 3]
+    assert sorted(titles) == ['Café', 'Dune']
+
+
+@pytest.mark.asyncio
+async def test_csv_records_use_header_line():
+    lines = iter_lines(stream(b'title,author\r\n"Hello, world",Someone\r\nonly-one-column\r\n'))
+
+    records = [record async for record in iter_records(lines, 'csv')]
+
+    assert records == [(2, {'title': 'Hello, world', 'author': 'Someone'}), (3, 'Expected 2 columns, got 1')]
+
+
+@pytest.mark.asyncio
+async def test_overlong_lines_are_reported_without_being_buffered():
+    feed = b'title,author\n' + b'x' * 100 + b'\nDune,Frank Herbert\n' + b'y' * 100
+    lines = iter_lines(stream(feed), max_line_length=20)
+
+    records = [record async for record in iter_records(lines, 'csv')]
+
+    assert records == [(2, 'Line too long'), (3, {'title': 'Dune', 'author': 'Frank Herbert'}), (4, 'Line too long')]
+
+
+@pytest.mark.asyncio
+async def test_invalid_utf8_is_reported_per_line():
+    feed = 'title,author\nCaf\u00e9,Someone\n'.encode() + b'\xff\xfe,broken\nDune,Frank Herbert\n'
+    lines = iter_lines(stream(feed, chunk_size=17))  # the \u00e9 is cut between two chunks
+
+    records = [record async for record in iter_records(lines, 'csv')]
+
+    assert records == [(2, {'title': 'Caf\u00e9', 'author': 'Someone'}), (3, 'Invalid UTF-8'),
+                       (4, {'title': 'Dune', 'author': 'Frank Herbert'})]
+
+
+@pytest.mark.asyncio
+async def test_export_streams_rows_in_chunks(engine):
+    book_service = BookService(cache=NullCache())
+
+    async with AsyncSession(engine) as session:
+        session.add_all([
+            Book(title=f'Book {i}', author='Author', publisher='Publisher', published_date=date(2020, 1, 1),
+                 page_count=100, language='en')
+            for i in range(5)
+        ])
+        await session.commit()
+
+    session_maker = async_sessionmaker(engine, class_=AsyncSession)
+    chunks = [chunk async for chunk in book_service.export_books(session_maker, 'csv', chunk_size=2)]
+
+    assert chunks[0].startswith(b'uid,title,author')
+    assert len(chunks) == 4  # the header and three chunks of at most two rows
+    assert b''.join(chunks).count(b'\r\n') == 6
@@ -0,0 +1,87 @@
+from src.books.schemas import BookFilterModel
+from src.books.service import BookService
+from src.cache import InMemoryCache, LRUTTLCache, RedisCache
+from src.db.models import Book
+from src.tags import service as tag_service_module
+from src.tags.schemas import TagAddModel, TagCreateModel
+from src.tags.service import TagService
+from src.tests.fakes import FakeRedis
+from sqlmodel.ext.asyncio.session import AsyncSession
+from unittest.mock import patch
+from datetime import date
+import pytest
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUTTLCache(max_entries=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')  # 'b' is now the least recently used
+    lru.set('c', 3)
+
+    assert lru.get('a') == 1
+    assert lru.get('b') is None
+    assert lru.get('c') == 3
+
+
+def test_lru_expires_entries():
+    lru = LRUTTLCache(max_entries=10)
+
+    with patch('src.cache.time.monotonic', return_value=100.0):
+        lru.set('a', 1, ttl=5)
+
+    with patch('src.cache.time.monotonic', return_value=106.0):
+        assert lru.get('a') is None
+        assert len(lru) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', [lambda: InMemoryCache(), lambda: RedisCache(FakeRedis())])
+async def test_bump_namespace_changes_version(backend):
+    cache = backend()
+
+    version = await cache.namespace('books:list')
+    assert await cache.namespace('books:list') == version
+
+    await cache.bump_namespace('books:list')
+    assert await cache.namespace('books:list') != version
+
+
+@pytest.mark.asyncio
+async def test_book_detail_is_cached_until_invalidated(engine):
+    book_service = BookService(cache=RedisCache(FakeRedis()))
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        book = Book(title='Dune', author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                    page_count=412, language='en')
+        session.add(book)
+        await session.commit()
+
+        etag = '"unchanged"'  # the ETag of a write not yet seen, as a lagging replica would report it
+        assert (await book_service.get_book_detail(book.uid, session, etag)).title == 'Dune'
+
+        book.title = 'Dune Messiah'
+        await session.commit()
+        assert (await book_service.get_book_detail(book.uid, session, etag)).title == 'Dune'  # still served from the cache
+
+        await book_service.invalidate_book(book.uid, session)
+        assert (await book_service.get_book_detail(book.uid, session, etag)).title == 'Dune Messiah'
+
+
+@pytest.mark.asyncio
+async def test_tag_filtered_pages_are_dropped_when_a_book_is_tagged(engine, monkeypatch):
+    book_service = BookService(cache=InMemoryCache())
+    monkeypatch.setattr(tag_service_module, 'book_service', book_service)
+    filters = BookFilterModel(tag='classic')
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        book = Book(title='Dune', author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                    page_count=412, language='en')
+        session.add(book)
+        await session.commit()
+
+        assert (await book_service.get_all_books(session, filters=filters)).items == []
+
+        await TagService().add_tags_to_book(book.uid, TagAddModel(tags=[TagCreateModel(name='classic')]), session)
+
+        assert [item.title for item in (await book_service.get_all_books(session, filters=filters)).items] == ['Dune']
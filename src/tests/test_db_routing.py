@@ -0,0 +1,76 @@
+from src.db import main
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+import itertools
+import pytest
+
+
+class FakeSessionMaker:  # hands out its own name as the session
+    def __init__(self, name: str):
+        self.name = name
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self.name
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture
+def databases(monkeypatch):
+    monkeypatch.setattr(main, 'async_session', FakeSessionMaker('primary'))
+    monkeypatch.setattr(main, '_next_read_session',
+                        itertools.cycle([FakeSessionMaker('replica 1'), FakeSessionMaker('replica 2')]))
+
+
+def make_request(method: str) -> Request:
+    return Request({'type': 'http', 'method': method, 'headers': []})
+
+
+async def session_for(dependency, request: Request) -> str:
+    if dependency is main.get_read_session:
+        sessions = dependency(request, main.use_primary(request))
+    else:
+        sessions = dependency(request)
+    session = await anext(sessions)
+    await sessions.aclose()
+    return session
+
+
+@pytest.mark.asyncio
+async def test_reads_alternate_between_replicas(databases):
+    sessions = [await session_for(main.get_read_session, make_request('GET')) for _ in range(4)]
+
+    assert sessions == ['replica 1', 'replica 2', 'replica 1', 'replica 2']
+    assert await session_for(main.get_read_session, make_request('POST')) == 'primary'
+
+
+@pytest.mark.asyncio
+async def test_reads_stay_on_the_primary_once_the_request_writes(databases):
+    request = make_request('GET')
+
+    assert await session_for(main.get_session, request) == 'primary'
+    assert request.state.use_primary
+    assert await session_for(main.get_read_session, request) == 'primary'  # reads its own writes
+    assert await session_for(main.get_read_session, make_request('GET')) == 'replica 1'
+
+
+def test_a_writing_route_reads_from_the_primary_whatever_the_dependency_order(databases):
+    app = FastAPI()
+
+    @app.get('/read-then-write')
+    async def read_then_write(read=Depends(main.get_read_session), write=Depends(main.get_session)):
+        return {'read': read, 'write': write}
+
+    @app.get('/read')
+    async def read_only(read=Depends(main.get_read_session)):
+        return {'read': read}
+
+    client = TestClient(app)
+
+    assert client.get('/read-then-write').json() == {'read': 'primary', 'write': 'primary'}
+    assert client.get('/read').json() == {'read': 'replica 1'}
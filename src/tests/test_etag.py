@@ -0,0 +1,97 @@
+from src.books.service import BookService
+from src.books.schemas import BookFilterModel, BookUpdateModel
+from src.cache import InMemoryCache, NullCache
+from src.db.models import Book, Review, TableVersion
+from src.etag import etag_matches, make_etag
+from src.tags.schemas import TagAddModel, TagCreateModel
+from src.tags.service import TagService
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+from datetime import date
+import pytest
+
+
+def make_request(if_none_match: str) -> Request:
+    return Request({'type': 'http', 'headers': [(b'if-none-match', if_none_match.encode())]})
+
+
+def test_etag_matches_any_listed_tag():
+    etag = make_etag('books', 3)
+
+    assert etag_matches(make_request(f'"other", W/{etag}'), etag)
+    assert etag_matches(make_request('*'), etag)
+    assert not etag_matches(make_request(make_etag('books', 4)), etag)
+
+
+@pytest.mark.asyncio
+async def test_book_etag_changes_with_reviews(engine):
+    book_service = BookService(cache=NullCache())
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        book = Book(title='Dune', author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                    page_count=412, language='en')
+        session.add(book)
+        await session.commit()
+
+        etag = await book_service.get_book_etag(book.uid, session)
+        assert await book_service.get_book_etag(book.uid, session) == etag
+
+        session.add(Review(rating=4, review_text='Spice', book_uid=book.uid))
+        await session.commit()
+
+        assert await book_service.get_book_etag(book.uid, session) != etag
+
+
+@pytest.mark.asyncio
+async def test_cached_detail_matches_its_etag_across_workers(engine):
+    reader, writer = BookService(cache=InMemoryCache()), BookService(cache=InMemoryCache())  # two workers
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        book = Book(title='Dune', author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                    page_count=412, language='en')
+        session.add(book)
+        await session.commit()
+
+        etag = await reader.get_book_etag(book.uid, session)
+        assert (await reader.get_book_detail(book.uid, session, etag)).title == 'Dune'
+
+        await writer.update_book(book.uid, BookUpdateModel(title='Dune Messiah', author='Frank Herbert',
+                                                           publisher='Chilton', page_count=412, language='en'), session)
+
+        new_etag = await reader.get_book_etag(book.uid, session)
+        assert new_etag != etag
+        assert (await reader.get_book_detail(book.uid, session, new_etag)).title == 'Dune Messiah'  # not the reader's copy
+
+
+@pytest.mark.asyncio
+async def test_listing_etag_changes_once_a_write_is_committed(engine):
+    book_service = BookService(cache=NullCache())
+    tagged = BookFilterModel(tag='classic')
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        assert await book_service.get_books_etag(session, BookFilterModel()) is None  # no version, no ETag
+
+        session.add(TableVersion(name='books'))
+        books = [Book(title=title, author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                      page_count=412, language='en') for title in ('Dune', 'Dune Messiah')]
+        session.add_all(books)
+        await session.commit()
+        seen = {await book_service.get_books_etag(session, BookFilterModel()),
+                await book_service.get_books_etag(session, tagged)}
+
+        async def changed(filters: BookFilterModel) -> bool:
+            etag = await book_service.get_books_etag(session, filters)
+            is_new = etag not in seen
+            seen.add(etag)
+            return is_new
+
+        await book_service.update_book(books[0].uid, BookUpdateModel(title='Dune', author='Frank Herbert',
+                                                                     publisher='Ace', page_count=412, language='en'), session)
+        assert await changed(BookFilterModel())
+
+        await TagService().add_tags_to_book(books[1].uid, TagAddModel(tags=[TagCreateModel(name='classic')]), session)
+        assert await changed(tagged)
+
+        await book_service.delete_book(books[0].uid, session)
+        assert await changed(BookFilterModel())
+        assert not await changed(BookFilterModel())  # nothing changed since
@@ -0,0 +1,73 @@
+from src.auth.hashing import PasswordHasher
+from src.auth.utils import _hash_password, _verify_password, create_passwd_context
+from src.errors import PasswordHashingOverloaded
+import asyncio
+import time
+import pytest
+
+
+def slow_square(x: int) -> int:
+    time.sleep(0.05)  # stands in for bcrypt, which holds no GIL while hashing
+    return x * x
+
+
+@pytest.mark.asyncio
+async def test_hashing_runs_off_the_event_loop():
+    hasher = PasswordHasher(executor='thread', workers=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    results = await asyncio.gather(*[hasher.run(slow_square, i) for i in range(6)])
+    task.cancel()
+    hasher.shutdown()
+
+    assert results == [i * i for i in range(6)]
+    assert ticks >= 10  # the loop kept running during about 150ms of hashing
+    stats = hasher.snapshot()
+    assert stats['completed'] == 6
+    assert stats['max_queued'] >= 4  # only two hashes ran at once
+    assert stats['running'] == stats['queued'] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_turns_callers_away():
+    hasher = PasswordHasher(executor='thread', workers=1, max_queue=2)
+
+    results = await asyncio.gather(*[hasher.run(slow_square, i) for i in range(4)], return_exceptions=True)
+    hasher.shutdown()
+
+    assert sum(isinstance(result, PasswordHashingOverloaded) for result in results) == 1
+    assert hasher.snapshot()['rejected'] == 1
+
+
+@pytest.mark.asyncio
+async def test_process_pool_hashes_passwords():
+    hasher = PasswordHasher(executor='process', workers=1)
+
+    hash = await hasher.run(_hash_password, 'secret')
+    valid = await hasher.run(_verify_password, 'secret', hash)
+    hasher.shutdown()
+
+    assert valid
+
+
+def test_outdated_hashes_are_upgraded_on_verify():
+    old_context = create_passwd_context('bcrypt', bcrypt_rounds=4)
+    context = create_passwd_context('argon2', argon2_time_cost=1, argon2_memory_cost=1024)
+    old_hash = old_context.hash('secret')
+
+    assert context.verify_and_update('wrong', old_hash) == (False, None)  # never rehash on a failed login
+
+    valid, new_hash = context.verify_and_update('secret', old_hash)
+    assert valid
+    assert new_hash.startswith('$argon2id$')
+    assert context.verify_and_update('secret', new_hash) == (True, None)
+
+    assert create_passwd_context('argon2', argon2_time_cost=2, argon2_memory_cost=1024).needs_update(new_hash)
+    assert create_passwd_context('bcrypt', bcrypt_rounds=5).needs_update(old_hash)
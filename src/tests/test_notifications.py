@@ -0,0 +1,249 @@
+from src.notifications.batching import MessageBatcher
+from src.notifications.consumer import NotificationConsumer
+from src.notifications.outbox import OutboxRelay
+from src.notifications.publisher import ServiceBusPublisher
+from src.reviews.schemas import ReviewCreateModel
+from src.reviews.service import ReviewService
+from src.db.models import Book, OutboxMessage, User
+from src.tests.fakes import FakeServiceBus
+from azure.servicebus import ServiceBusMessage
+from azure.servicebus.exceptions import MessageSizeExceededError, ServiceBusConnectionError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import date
+import asyncio
+import httpx
+import json
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_publisher_reuses_one_connection():
+    bus = FakeServiceBus()
+    publisher = ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string)
+
+    await asyncio.gather(*[publisher.send(ServiceBusMessage(f'Dune|review {i}')) for i in range(10)])
+
+    assert bus.connects == 1
+    assert len(bus.queues['reviews']) == 10
+
+
+@pytest.mark.asyncio
+async def test_publisher_reconnects_after_a_failed_send():
+    bus = FakeServiceBus()
+    publisher = ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string)
+    await publisher.start()
+
+    bus.fail_sends = 1
+    await publisher.send(ServiceBusMessage('Dune|lost the connection'))
+
+    assert bus.queues['reviews'] == ['Dune|lost the connection']
+    assert publisher.snapshot()['connects'] == 2
+
+    await publisher.close()
+    assert not publisher.snapshot()['connected']
+
+
+@pytest.mark.asyncio
+async def test_reviews_are_relayed_from_the_outbox(engine):
+    bus = FakeServiceBus(max_batch_bytes=400)  # a few messages per batch
+    relay = OutboxRelay(MessageBatcher(ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string)),
+                        session_maker=lambda: AsyncSession(engine), batch_size=10)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = User(username='reader', email='reader@bookly.com', first_name='Book', last_name='Reader',
+                    password_hash='hash')
+        book = Book(title='Dune', author='Frank Herbert', publisher='Chilton', published_date=date(1965, 8, 1),
+                    page_count=412, language='en')
+        session.add_all([user, book])
+        await session.commit()
+
+        for i in range(12):
+            await ReviewService().add_review_to_book(user.email, book.uid, ReviewCreateModel(rating=4, review_text=f'Review {i}'),
+                                                     session)
+
+    assert bus.queues == {}  # nothing is published in the request
+
+    assert await relay.relay_batch() == 10
+    assert await relay.relay_batch() == 2
+    assert await relay.relay_batch() == 0
+
+    assert bus.queues['reviews'] == [f'Dune|Review {i}' for i in range(12)]
+    assert 1 < bus.sends < 12  # batched
+
+    await relay.batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_outbox_rows_stay_until_the_broker_takes_them(engine):
+    bus = FakeServiceBus()
+    relay = OutboxRelay(MessageBatcher(ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string)),
+                        session_maker=lambda: AsyncSession(engine))
+
+    async with AsyncSession(engine) as session:
+        session.add(OutboxMessage(body='Dune|Review'))
+        await session.commit()
+
+    bus.fail_sends = 2  # the send and its retry on a new connection
+    with pytest.raises(ServiceBusConnectionError):
+        await relay.relay_batch()
+
+    assert await relay.relay_batch() == 1
+    assert bus.queues['reviews'] == ['Dune|Review']
+
+    await relay.batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_concurrent_publishes():
+    bus = FakeServiceBus(send_latency=0.01)
+    batcher = MessageBatcher(ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string),
+                             max_count=10, linger=0.05, max_pending=5)
+
+    await asyncio.gather(*[batcher.publish(ServiceBusMessage(f'Dune|review {i}')) for i in range(25)])
+
+    stats = batcher.snapshot()
+    assert sorted(bus.queues['reviews']) == sorted(f'Dune|review {i}' for i in range(25))
+    assert bus.sends == stats['flushes'] < 25
+    assert stats['max_messages_per_batch'] <= 10
+    assert stats['backpressure_waits'] > 0  # only 5 fit in the queue at once
+
+    batcher.max_batch_bytes = 300  # two of these messages at most
+    await asyncio.gather(*[batcher.publish(ServiceBusMessage('x' * 100)) for i in range(4)])
+    assert batcher.snapshot()['flush_reasons']['bytes'] >= 1
+
+    with pytest.raises(MessageSizeExceededError):
+        await batcher.publish(ServiceBusMessage('x' * 1000))
+
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_batcher_fails_only_the_message_a_batch_refuses():
+    bus = FakeServiceBus()
+    batcher = MessageBatcher(ServiceBusPublisher('conn', 'reviews', client_factory=bus.from_connection_string))
+
+    results = await asyncio.wait_for(asyncio.gather(
+        batcher.publish(ServiceBusMessage('Dune|first')),
+        batcher.publish(123),
+        batcher.publish(ServiceBusMessage('Dune|last')),
+        return_exceptions=True
+    ), timeout=1)
+
+    assert results[0] is None and isinstance(results[1], TypeError) and results[2] is None
+    assert bus.queues['reviews'] == ['Dune|first', 'Dune|last']
+
+    await batcher.close()
+
+
+class RecordingConsumer(NotificationConsumer):  # a slow webhook which remembers what it was called with
+    def __init__(self, webhook_latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.webhook_latency = webhook_latency
+        self.calls = []
+        self.failed = False
+        self.running = 0
+        self.max_running = 0
+
+    async def invoke_webhook(self, book_name: str, review_content: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.webhook_latency)
+            if review_content == 'fails once' and not self.failed:
+                self.failed = True
+                raise RuntimeError('Webhook is down')
+            self.calls.append((book_name, review_content))
+        finally:
+            self.running -= 1
+
+
+async def consume(consumer: NotificationConsumer, bus: FakeServiceBus, messages: int, task=None):
+    task = task or asyncio.create_task(consumer.process_messages())
+    while len(bus.completed) < messages and not task.done():
+        await asyncio.sleep(0.01)
+    if task.done():  # stopped on an error instead of waiting for messages
+        task.result()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_consumer_handles_messages_concurrently_and_in_order_per_book():
+    bus = FakeServiceBus()
+    books = ['Dune', 'Emma', 'Ulysses']  # which land on three different workers
+    bus.queues['reviews'] = [f'{books[i % 3]}|review {i}' for i in range(30)] + ['Dune|fails once']
+    consumer = RecordingConsumer(0.01, concurrency=4, ordered=True, lock_renewal_interval=0.004,
+                                 client_factory=bus.from_connection_string)
+    consumer.queue_name = 'reviews'
+
+    await consume(consumer, bus, 31)
+
+    assert consumer.max_running == 3  # one per book, the fourth worker has no book of its own
+    for n, book in enumerate(books):
+        reviews = [review for title, review in consumer.calls if title == book]
+        assert reviews[:10] == [f'review {i}' for i in range(n, 30, 3)]
+    assert consumer.snapshot()['abandoned'] == 1  # and delivered again
+    assert consumer.snapshot()['lock_renewals'] > 0
+    assert consumer.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_consumer_never_takes_more_than_it_can_handle():
+    bus = FakeServiceBus()
+    bus.queues['reviews'] = [f'Dune|review {i}' for i in range(20)]
+    consumer = RecordingConsumer(0.02, concurrency=5, lock_renewal_interval=0,
+                                 client_factory=bus.from_connection_string)
+    consumer.queue_name = 'reviews'
+
+    task = asyncio.create_task(consumer.process_messages())
+    await asyncio.sleep(0.01)
+    assert consumer.in_flight == 5 and len(bus.queues['reviews']) == 15  # the rest is left to other consumers
+
+    await consume(consumer, bus, 20, task)
+
+    assert consumer.max_running == 5
+
+
+@pytest.mark.asyncio
+async def test_consumer_reuses_one_http_client_until_stopped():
+    requests = []
+
+    def webhook(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    bus = FakeServiceBus()
+    bus.queues['reviews'] = [f'Dune|review {i}' for i in range(10)]
+    consumer = NotificationConsumer(concurrency=4, lock_renewal_interval=0, client_factory=bus.from_connection_string,
+                                    transport=httpx.MockTransport(webhook))
+    consumer.queue_name = 'reviews'
+
+    consumer.start()
+    while len(bus.completed) < 10:
+        await asyncio.sleep(0.01)
+    client = consumer._http_client  # the one every message went through
+
+    await consumer.stop()
+
+    assert len(requests) == 10 and requests[0]['book_title'] == 'Dune'
+    assert consumer.snapshot()['webhook_calls'] == 10
+    assert client.is_closed and consumer._http_client is None
+
+
+@pytest.mark.asyncio
+async def test_consumer_renews_the_locks_of_messages_waiting_for_their_worker():
+    class LockRecordingConsumer(RecordingConsumer):
+        async def handle_message(self, receiver, message, body: str):
+            renewals_before_handling.append(message.lock_renewals)
+            await super().handle_message(receiver, message, body)
+
+    renewals_before_handling = []
+    bus = FakeServiceBus()
+    bus.queues['reviews'] = [f'Dune|review {i}' for i in range(3)]  # one book, handled one after the other
+    consumer = LockRecordingConsumer(0.05, concurrency=3, ordered=True, lock_renewal_interval=0.01,
+                                     client_factory=bus.from_connection_string)
+    consumer.queue_name = 'reviews'
+
+    await consume(consumer, bus, 3)
+
+    assert renewals_before_handling[0] == 0 and renewals_before_handling[2] > 0  # renewed while queued
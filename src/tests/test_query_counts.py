@@ -0,0 +1,175 @@
+from src.books.service import BookService
+from src.books.aggregates import recompute_rating_aggregates
+from src.books.schemas import BookFilterModel, BookUpdateModel
+from src.cache import NullCache
+from src.config import Config
+from src.errors import BookNotFound
+from src.reviews.service import ReviewService
+from src.tags.schemas import TagAddModel, TagCreateModel
+from src.tags.service import TagService
+from src.db.models import Book, Review, Tag, User
+from sqlalchemy import event, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import date
+import pytest_asyncio
+import uuid
+import pytest
+
+MAX_LIST_STATEMENTS = 1  # a page of books must be a single SELECT, whatever hangs off the books
+MAX_DETAIL_STATEMENTS = 3  # the book plus one SELECT ... IN for reviews and one for tags
+
+
+@pytest_asyncio.fixture
+async def seeded_book(engine):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = User(username='reader', email='reader@bookly.com', first_name='Book', last_name='Reader',
+                    password_hash='hash')
+        tags = [Tag(name=f'tag-{i}') for i in range(3)]
+        books = [
+            Book(title=f'Book {i}', author='Author', publisher='Publisher', published_date=date(2020, 1, 1),
+                 page_count=100, language='en', user=user, tags=tags, review_count=3, rating_sum=12, rating_avg=4)
+            for i in range(10)
+        ]
+        for book in books:
+            for i in range(3):
+                session.add(Review(rating=4, review_text=f'Review {i}', user=user, book=book))
+
+        session.add_all(books)
+        await session.commit()
+
+        return books[0]
+
+
+def count_statements(engine) -> list:
+    statements = []
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+@pytest.mark.asyncio
+async def test_book_list_does_not_load_relationships(engine, seeded_book):
+    statements = count_statements(engine)
+
+    async with AsyncSession(engine) as session:
+        page = await BookService(cache=NullCache()).get_all_books(session, limit=5)
+
+    assert len(page.items) == 5
+    assert len(statements) <= MAX_LIST_STATEMENTS
+
+
+@pytest.mark.asyncio
+async def test_user_book_list_does_not_load_relationships(engine, seeded_book):
+    statements = count_statements(engine)
+
+    async with AsyncSession(engine) as session:
+        page = await BookService(cache=NullCache()).get_user_books(seeded_book.user_uid, session, limit=20)
+
+    assert len(page.items) == 10
+    assert len(statements) <= MAX_LIST_STATEMENTS
+
+
+@pytest.mark.asyncio
+async def test_book_detail_loads_relationships_explicitly(engine, seeded_book):
+    statements = count_statements(engine)
+
+    async with AsyncSession(engine) as session:
+        book = await BookService(cache=NullCache()).get_book(seeded_book.uid, session)
+
+    assert len(book.reviews) == 3
+    assert len(book.tags) == 3
+    assert len(statements) <= MAX_DETAIL_STATEMENTS
+
+
+@pytest.mark.asyncio
+async def test_filtered_and_sorted_pages_are_single_statements(engine, seeded_book):
+    filters = BookFilterModel(tag='tag-1', min_rating=3, sort_by='rating', order='desc')
+    statements = count_statements(engine)
+    books = []
+
+    async with AsyncSession(engine) as session:
+        service = BookService(cache=NullCache())
+        page = await service.get_all_books(session, limit=4, filters=filters)
+        books += page.items
+        while page.next_cursor is not None:
+            page = await service.get_all_books(session, limit=4, cursor=page.next_cursor, filters=filters)
+            books += page.items
+
+    assert len({book.uid for book in books}) == 10  # every book once across the pages
+    assert len(statements) <= 3 * MAX_LIST_STATEMENTS
+
+
+@pytest.mark.asyncio
+async def test_rating_aggregates_follow_the_reviews(engine, seeded_book):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        service = BookService(cache=NullCache())
+        await session.exec(update(Book).values(review_count=0, rating_sum=0, rating_avg=0))
+        await session.commit()
+        await recompute_rating_aggregates(lambda: AsyncSession(engine), batch_size=3)
+
+        book = await service.get_book(seeded_book.uid, session)
+        assert (book.review_count, book.rating_sum, book.rating_avg) == (3, 12, 4)
+
+        session.add(Review(rating=1, review_text='Meh', user_uid=seeded_book.user_uid, book_uid=seeded_book.uid))
+        await service.apply_review_change(seeded_book.uid, session, 1, 1)
+        await session.commit()
+        await session.refresh(book)
+        assert (book.review_count, book.rating_sum, book.rating_avg) == (4, 13, 3.25)
+
+        page = await service.get_all_books(session, limit=1, filters=BookFilterModel(sort_by='rating', order='asc'))
+        assert page.items[0].uid == seeded_book.uid
+
+
+@pytest.mark.asyncio
+async def test_book_detail_embeds_a_bounded_review_preview(engine, seeded_book, monkeypatch):
+    monkeypatch.setattr(Config, 'BOOK_DETAIL_REVIEWS', 2)
+    statements = count_statements(engine)
+
+    async with AsyncSession(engine) as session:
+        book = await BookService(cache=NullCache()).get_book_detail(seeded_book.uid, session)
+
+    assert len(book.reviews) == 2
+    assert book.review_count == 3
+    assert len(book.tags) == 3
+    assert len(statements) <= MAX_DETAIL_STATEMENTS
+
+
+@pytest.mark.asyncio
+async def test_book_reviews_are_paginated(engine, seeded_book):
+    reviews = []
+
+    async with AsyncSession(engine) as session:
+        for sort in ('newest', 'rating'):
+            page = await ReviewService().get_book_reviews(seeded_book.uid, session, sort=sort, limit=2)
+            reviews += page.items
+            page = await ReviewService().get_book_reviews(seeded_book.uid, session, sort=sort, limit=2,
+                                                          cursor=page.next_cursor)
+            reviews += page.items
+            assert page.next_cursor is None
+
+        with pytest.raises(BookNotFound):
+            await ReviewService().get_book_reviews(uuid.uuid4(), session)
+
+    assert len({review.uid for review in reviews}) == 3
+    assert len(reviews) == 6
+
+
+@pytest.mark.asyncio
+async def test_book_writes_do_not_load_the_reviews(engine, seeded_book):
+    statements = count_statements(engine)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        service = BookService(cache=NullCache())
+        await service.update_book(seeded_book.uid, BookUpdateModel(title='Renamed', author='Author', publisher='Publisher',
+                                                                   page_count=100, language='en'), session)
+        await TagService().add_tags_to_book(seeded_book.uid, TagAddModel(tags=[TagCreateModel(name='new')]), session)
+        await service.delete_book(seeded_book.uid, session)
+
+        orphans = (await session.exec(select(Review).where(Review.book_uid.is_(None)))).all()
+
+    assert not any(statement.lstrip().startswith('SELECT reviews') for statement in statements[:-1])
+    assert len(orphans) == 3  # kept without their book, as before
@@ -0,0 +1,166 @@
+from src.auth import service, utils
+from src.auth.schemas import UserCreateModel
+from src.auth.dependencies import AccessTokenBearer, RoleChecker
+from src.auth.utils import create_access_token, decode_token
+from src.cache import LRUTTLCache
+from src.db.main import get_read_session
+from src.errors import UserAlreadyExists
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+from unittest.mock import Mock
+from datetime import timedelta
+import pytest
+import jwt
+
+
+@pytest.fixture
+def jwt_decodes(monkeypatch):
+    calls = []
+    decode = utils.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(kwargs.get('jwt'))
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(utils.jwt, 'decode', counting_decode)
+    monkeypatch.setattr(utils, 'verified_tokens', LRUTTLCache(100))
+
+    return calls
+
+
+def test_token_is_verified_once_per_request(jwt_decodes, monkeypatch):
+    monkeypatch.setattr(utils, 'verified_tokens', None)  # no cache, only the request state is shared
+    app = FastAPI()
+
+    @app.get('/', dependencies=[Depends(AccessTokenBearer())])  # like a route bearer plus the one in get_current_user
+    async def route(token_details: dict = Depends(AccessTokenBearer())):
+        return token_details['user']
+
+    token = create_access_token(user_data={'email': 'reader@bookly.com'})
+    response = TestClient(app).get('/', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.json() == {'email': 'reader@bookly.com'}
+    assert len(jwt_decodes) == 1
+
+
+def test_verified_tokens_are_cached_until_they_expire(jwt_decodes):
+    token = create_access_token(user_data={'email': 'reader@bookly.com'})
+
+    assert decode_token(token) == decode_token(token)
+    assert len(jwt_decodes) == 1
+
+    expired = create_access_token(user_data={'email': 'reader@bookly.com'}, expiry=timedelta(hours=-24))
+
+    assert decode_token(expired) is None
+    assert decode_token(expired) is None
+    assert len(jwt_decodes) == 3  # a rejected token is never cached
+
+
+class CountingSession:  # stands in for the read session, the claims are all the checker may need
+    def __init__(self, row=None):
+        self.row = row
+        self.statements = 0
+
+    async def exec(self, statement):
+        self.statements += 1
+        return Mock(first=Mock(return_value=self.row))
+
+
+def client_with_role_checker(session: CountingSession) -> TestClient:
+    app = FastAPI()
+
+    async def get_session():
+        yield session
+
+    app.dependency_overrides[get_read_session] = get_session
+
+    @app.get('/', dependencies=[Depends(RoleChecker(['user']))])
+    async def route():
+        return {}
+
+    return TestClient(app)
+
+
+def test_claims_authorize_without_a_user_lookup():
+    session = CountingSession()
+    token = create_access_token(user_data={'email': 'reader@bookly.com', 'role': 'user', 'is_verified': True})
+
+    response = client_with_role_checker(session).get('/', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert session.statements == 0
+
+
+def test_tokens_without_claims_fall_back_to_a_cached_lookup(monkeypatch):
+    monkeypatch.setattr(service, 'user_claims_cache', LRUTTLCache(100))
+    session = CountingSession(row=Mock(role='user', is_verified=True))
+    client = client_with_role_checker(session)
+    token = create_access_token(user_data={'email': 'reader@bookly.com'})  # issued before the claims existed
+
+    for _ in range(3):
+        assert client.get('/', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+
+    assert session.statements == 1
+
+
+@pytest.mark.asyncio
+async def test_emails_are_matched_case_insensitively(engine):
+    user_service = service.UserService()
+    user_data = UserCreateModel(username='reader', email=' Reader@Bookly.com', first_name='Book', last_name='Reader',
+                                password='secret-password')
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = await user_service.create_user(user_data, session)
+        assert user.email == 'reader@bookly.com'
+        assert await user_service.user_exists('READER@bookly.com', session)
+        assert (await user_service.get_user_by_email('reader@BOOKLY.com', session)).uid == user.uid
+
+        with pytest.raises(UserAlreadyExists):  # the unique index backs up the user_exists check
+            await user_service.create_user(user_data, session)
+
+
+def test_rotated_keys_keep_verifying_and_are_published(monkeypatch, jwt_decodes):
+    from src.auth.keys import KeyRing, generate_key
+
+    old_key, new_key = generate_key('rsa'), generate_key('ed25519')
+    old_ring = KeyRing()
+    old_kid = old_ring.set_signing_key(old_key)
+    monkeypatch.setattr(utils, 'key_ring', old_ring)
+    old_token = create_access_token(user_data={'email': 'reader@bookly.com'})
+
+    ring = KeyRing()
+    new_kid = ring.set_signing_key(new_key)
+    ring.add_public_key(old_key.public_key())  # retired, still verifies what it signed
+    monkeypatch.setattr(utils, 'key_ring', ring)
+    new_token = create_access_token(user_data={'email': 'reader@bookly.com'})
+
+    assert jwt.get_unverified_header(new_token)['kid'] == new_kid
+    assert decode_token(old_token)['user'] == decode_token(new_token)['user'] == {'email': 'reader@bookly.com'}
+
+    jwks = jwt.PyJWKSet.from_dict(ring.jwks())  # what another service would fetch from /auth/jwks.json
+    assert {key.key_id for key in jwks.keys} == {old_kid, new_kid}
+    assert jwt.decode(new_token, key=jwks[new_kid], algorithms=['EdDSA'])['user'] == {'email': 'reader@bookly.com'}
+
+    monkeypatch.setattr(utils, 'key_ring', KeyRing())  # the old key is dropped from the ring
+    utils.verified_tokens.clear()
+    assert decode_token(old_token) is None
+
+
+def test_secret_signed_tokens_are_rejected_once_a_key_pair_signs(monkeypatch, tmp_path, jwt_decodes):
+    from cryptography.hazmat.primitives import serialization
+    from src.auth.keys import generate_key, load_key_ring
+
+    legacy_token = create_access_token(user_data={'email': 'reader@bookly.com'})  # signed with JWT_SECRET, no kid
+    key_file = tmp_path / 'signing.pem'
+    key_file.write_bytes(generate_key('ed25519').private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    monkeypatch.setattr(utils.Config, 'JWT_SIGNING_KEY', str(key_file))
+    utils.verified_tokens.clear()
+
+    monkeypatch.setattr(utils, 'key_ring', load_key_ring())
+    assert decode_token(legacy_token) is None
+
+    monkeypatch.setattr(utils.Config, 'JWT_ACCEPT_SECRET_SIGNED', True)  # opted in while switching
+    monkeypatch.setattr(utils, 'key_ring', load_key_ring())
+    assert decode_token(legacy_token)['user'] == {'email': 'reader@bookly.com'}